@@ -1,15 +1,27 @@
 from flask import Flask
 from flask_cors import CORS
-from application.database import db
+from werkzeug.middleware.proxy_fix import ProxyFix
+from application.database import db, configure_engine
 from application.models import User, Role
 from application.config import LocalDevelopmentConfig, ProductionConfig
-from flask_security import Security, datastore, SQLAlchemyUserDatastore, hash_password
+from flask_security import Security
 from application.resources import api
-from werkzeug.security import generate_password_hash, check_password_hash
+from application.auth_cache import CachedUserDatastore, user_cache
+from application.metrics import init_metrics
+from application.response_cache import response_cache
+from application.jobs import job_worker
+import application.archive  # registers the archive job handler
+from application.ratelimit import rate_limiter
+from application.passwords import password_hasher
+from application.commands import init_db, seed_db, register_commands
+from application.serializers import FastJSONProvider
 import os
 
 def create_app():
     app = Flask(__name__)
+    # Set the class too: Flask-Security rebuilds app.json from a subclass of it
+    app.json_provider_class = FastJSONProvider
+    app.json = FastJSONProvider(app)
     
     # Use production config if FLASK_ENV is production
     if os.environ.get('FLASK_ENV') == 'production':
@@ -23,48 +35,46 @@ def create_app():
         app.config.from_object(LocalDevelopmentConfig)
         cors_origins = ["http://localhost:5173"]
     
+    hops = app.config.get('PROXY_FIX_HOPS', 0)
+    if hops:
+        # Rate limits key anonymous callers on remote_addr, which is the proxy's address unless unwrapped here
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+    
     # Enable CORS with proper headers
     CORS(app, 
          origins=cors_origins, 
          supports_credentials=True,
-         allow_headers=['Content-Type', 'Authorization', 'Authentication-Token'],
+         allow_headers=['Content-Type', 'Authorization', 'Authentication-Token', 'If-Match', 'Idempotency-Key',
+                        'If-None-Match', 'If-Modified-Since', 'Prefer'],
+         expose_headers=['ETag', 'Location', 'Retry-After'],
          methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'])
     
     db.init_app(app)
+    configure_engine(app)
     api.init_app(app)
-    datastore = SQLAlchemyUserDatastore(db, User, Role)
+    user_cache.init_app(app)
+    response_cache.init_app(app)
+    # Registered before any other request hook so rejected requests do no work
+    rate_limiter.init_app(app)
+    job_worker.init_app(app)
+    password_hasher.init_app(app)
+    datastore = CachedUserDatastore(db, User, Role)
     app.security = Security(app, datastore)
     
     # Register routes after app is configured
     from application.routes import register_routes
     register_routes(app)
+    register_commands(app)
+    init_metrics(app)
     
     return app
 
 app = create_app()
 
-with app.app_context():
-    db.create_all()
-    app.security.datastore.find_or_create_role(name='admin', description='Super user of app')
-    app.security.datastore.find_or_create_role(name='user', description='Normal user of app')
-    db.session.commit()
-
-    if not app.security.datastore.find_user(email='user0@admin.com'):
-        user = app.security.datastore.create_user(
-            email='user0@admin.com',
-            username='admin01',
-            password=generate_password_hash('1234'),
-            roles=['admin', 'user']
-        )
-    if not app.security.datastore.find_user(email='user01@user.com'):
-        user = app.security.datastore.create_user(
-            email='user01@user.com',
-            username='user01',
-            password=generate_password_hash('1234'),
-            roles=['user']
-        )
-    db.session.commit()
-
 if __name__ == "__main__":
     port = int(os.environ.get('PORT', 5000))
+    # Local runs skip the release step, so set the database up here
+    with app.app_context():
+        init_db()
+        seed_db()
     app.run(host='0.0.0.0', port=port, debug=os.environ.get('FLASK_ENV') != 'production')
\ No newline at end of file
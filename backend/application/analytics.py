@@ -0,0 +1,295 @@
+import datetime
+import logging
+import sqlalchemy as sa
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from application.database import db
+from application.jobs import enqueue, job_handler, schedule_once
+from application.models import Job, LaneDailyRollup, LaneRollupDirty, Transaction, TransactionArchive
+
+logger = logging.getLogger(__name__)
+
+TRIGGER_PREFIX = 'lane_rollup'
+# Columns whose changes can move a shipment between lanes/days or change its metrics
+TRACKED_COLUMNS = ('source_city', 'destination_city', 'date', 'amount', 'internal_status',
+                   'delivery_status', 'delivery_date')
+# Order of the additive metrics in rollup rows and window arrays
+METRICS = ('shipments', 'amount_sum', 'revenue', 'delivered', 'on_time', 'transit_days_sum')
+KEY_CHUNK_SIZE = 500
+
+def _mark(row):
+    table = LaneRollupDirty.__tablename__
+    return (f'INSERT INTO {table} (source_city, destination_city, day) '
+            f'VALUES ({row}.source_city, {row}.destination_city, {row}.date);')
+
+def _sqlite_triggers(table):
+    columns = ', '.join(TRACKED_COLUMNS)
+    return {
+        f'{TRIGGER_PREFIX}_ai': f'CREATE TRIGGER {TRIGGER_PREFIX}_ai AFTER INSERT ON {table} BEGIN {_mark("new")} END',
+        f'{TRIGGER_PREFIX}_ad': f'CREATE TRIGGER {TRIGGER_PREFIX}_ad AFTER DELETE ON {table} BEGIN {_mark("old")} END',
+        f'{TRIGGER_PREFIX}_au': f'CREATE TRIGGER {TRIGGER_PREFIX}_au AFTER UPDATE OF {columns} ON {table} '
+                                f'BEGIN {_mark("old")} {_mark("new")} END',
+    }
+
+def _postgres_ddl(table):
+    return [
+        f"""CREATE OR REPLACE FUNCTION {TRIGGER_PREFIX}_mark() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN {_mark('OLD')} END IF;
+            IF TG_OP <> 'DELETE' THEN {_mark('NEW')} END IF;
+            RETURN NULL;
+        END $$ LANGUAGE plpgsql""",
+        f'DROP TRIGGER IF EXISTS {TRIGGER_PREFIX}_mark ON {table}',
+        f'CREATE TRIGGER {TRIGGER_PREFIX}_mark AFTER INSERT OR DELETE OR UPDATE OF {", ".join(TRACKED_COLUMNS)} '
+        f'ON {table} FOR EACH ROW EXECUTE FUNCTION {TRIGGER_PREFIX}_mark()',
+    ]
+
+def ensure_lane_rollups(engine=None):
+    """Install the triggers that record touched (lane, day) keys, rebuilding the rollups when they were missing.
+
+    Triggers catch ORM flushes and the bulk INSERT/UPDATE paths alike, in
+    the writer's own transaction.
+    """
+    engine = engine or db.engine
+    table = engine.dialect.identifier_preparer.quote(Transaction.__tablename__)
+    if engine.dialect.name == 'postgresql':
+        with engine.begin() as conn:
+            installed = conn.execute(sa.text('SELECT 1 FROM pg_trigger WHERE tgname = :name'),
+                                     {'name': f'{TRIGGER_PREFIX}_mark'}).first()
+            for ddl in _postgres_ddl(table):
+                conn.execute(sa.text(ddl))
+    elif engine.dialect.name == 'sqlite':
+        triggers = _sqlite_triggers(table)
+        with engine.begin() as conn:
+            existing = set(conn.execute(
+                sa.text('SELECT name FROM sqlite_master WHERE type = :type').bindparams(type='trigger')
+            ).scalars())
+            installed = all(name in existing for name in triggers)
+            for name, ddl in triggers.items():
+                if name not in existing:
+                    conn.execute(sa.text(ddl))
+    else:
+        logger.warning('Lane rollups are only maintained automatically on SQLite and PostgreSQL; '
+                       'run `flask analytics-refresh --rebuild` periodically instead')
+        installed = True
+    if not installed:
+        rebuild_lane_rollups()
+
+def _transit_days(model):
+    if db.engine.dialect.name == 'postgresql':
+        return model.delivery_date - model.date
+    return sa.func.julianday(model.delivery_date) - sa.func.julianday(model.date)
+
+def _table_aggregates(model, keys=None):
+    on_time_days = current_app.config.get('ANALYTICS_ON_TIME_DAYS', 5)
+    delivered = sa.and_(model.delivery_status == 'delivered', model.delivery_date.isnot(None))
+    transit = _transit_days(model)
+    on_time = sa.and_(delivered, transit <= on_time_days)
+    select = sa.select(
+        model.source_city,
+        model.destination_city,
+        model.date.label('day'),
+        sa.func.count(model.id).label('shipments'),
+        sa.func.coalesce(sa.func.sum(model.amount), 0.0).label('amount_sum'),
+        sa.func.coalesce(sa.func.sum(sa.case((model.internal_status == 'paid', model.amount), else_=0.0)), 0.0)
+        .label('revenue'),
+        sa.func.coalesce(sa.func.sum(sa.case((delivered, 1), else_=0)), 0).label('delivered'),
+        sa.func.coalesce(sa.func.sum(sa.case((on_time, 1), else_=0)), 0).label('on_time'),
+        sa.func.coalesce(sa.func.sum(sa.case((delivered, transit), else_=0)), 0.0).label('transit_days_sum'),
+    ).group_by(model.source_city, model.destination_city, model.date)
+    if keys is not None:
+        select = select.where(sa.tuple_(model.source_city, model.destination_city, model.date).in_(keys))
+    return select
+
+def _aggregate_select(keys=None):
+    """One rollup row per (lane, day), computed entirely in the database.
+
+    Archived shipments still count, so the hot and archive tables are
+    aggregated separately (each filtered through its own lane index) and
+    the two results summed.
+    """
+    combined = sa.union_all(_table_aggregates(Transaction, keys),
+                            _table_aggregates(TransactionArchive, keys)).subquery()
+    return sa.select(
+        combined.c.source_city, combined.c.destination_city, combined.c.day,
+        *[sa.func.sum(combined.c[metric]) for metric in METRICS]
+    ).group_by(combined.c.source_city, combined.c.destination_city, combined.c.day)
+
+def _insert_rollups(select):
+    db.session.execute(sa.insert(LaneDailyRollup).from_select(
+        ['source_city', 'destination_city', 'day', *METRICS], select
+    ))
+
+def rebuild_lane_rollups():
+    """Recompute every rollup row from the transaction and archive tables."""
+    last_dirty = db.session.execute(sa.select(sa.func.max(LaneRollupDirty.id))).scalar()
+    db.session.execute(sa.delete(LaneDailyRollup))
+    _insert_rollups(_aggregate_select())
+    if last_dirty is not None:
+        # Keys marked after this rebuild started still get refreshed
+        db.session.execute(sa.delete(LaneRollupDirty).where(LaneRollupDirty.id <= last_dirty))
+    db.session.commit()
+
+def refresh_lane_rollups(batch_size=None):
+    """Recompute rollups for a batch of touched (lane, day) keys; returns how many keys were refreshed.
+
+    Dirty rows are read before the aggregates, so a concurrent write either
+    shows up in this recompute or leaves a dirty row for the next one.
+    """
+    batch_size = batch_size or current_app.config.get('ANALYTICS_REFRESH_BATCH', 5000)
+    dirty = db.session.execute(
+        sa.select(LaneRollupDirty.id, LaneRollupDirty.source_city, LaneRollupDirty.destination_city,
+                  LaneRollupDirty.day).order_by(LaneRollupDirty.id).limit(batch_size)
+    ).all()
+    if not dirty:
+        db.session.commit()
+        return 0
+
+    keys = sorted({(row.source_city, row.destination_city, row.day) for row in dirty})
+    rollup_key = sa.tuple_(LaneDailyRollup.source_city, LaneDailyRollup.destination_city, LaneDailyRollup.day)
+    try:
+        for start in range(0, len(keys), KEY_CHUNK_SIZE):
+            chunk = keys[start:start + KEY_CHUNK_SIZE]
+            db.session.execute(sa.delete(LaneDailyRollup).where(rollup_key.in_(chunk)))
+            _insert_rollups(_aggregate_select(chunk))
+        dirty_ids = [row.id for row in dirty]
+        for start in range(0, len(dirty_ids), KEY_CHUNK_SIZE):
+            db.session.execute(sa.delete(LaneRollupDirty).where(
+                LaneRollupDirty.id.in_(dirty_ids[start:start + KEY_CHUNK_SIZE])))
+        db.session.commit()
+    except IntegrityError:
+        # Another worker refreshed the same keys first
+        db.session.rollback()
+        return 0
+    return len(keys)
+
+def has_pending_refresh():
+    return db.session.execute(sa.select(LaneRollupDirty.id).limit(1)).first() is not None
+
+def refresh_all_lane_rollups():
+    """Refresh batches until no touched keys are left; returns how many keys were refreshed."""
+    refreshed = 0
+    while True:
+        keys = refresh_lane_rollups()
+        if not keys and not has_pending_refresh():
+            return refreshed
+        refreshed += keys
+
+@job_handler('analytics_refresh')
+def refresh_job(payload):
+    refreshed = refresh_all_lane_rollups()
+    interval = current_app.config.get('ANALYTICS_REFRESH_INTERVAL_MINUTES', 5) * 60
+    if interval:
+        # Keeps the dirty table drained even where nobody reads analytics
+        schedule_once('analytics_refresh', interval)
+    return {'refreshed_keys': refreshed}
+
+def schedule_refresh():
+    # One refresh due now is enough; it drains everything marked so far. The next periodic run doesn't count.
+    pending = db.session.execute(
+        sa.select(Job.id).where(
+            Job.kind == 'analytics_refresh',
+            sa.or_(Job.status == 'running',
+                   sa.and_(Job.status == 'queued', Job.run_at <= datetime.datetime.utcnow()))
+        ).limit(1)
+    ).first()
+    if pending is None:
+        enqueue('analytics_refresh', {})
+
+def _rollup_filters(args):
+    filters = []
+    if args.get('source_city'):
+        filters.append(LaneDailyRollup.source_city == args['source_city'])
+    if args.get('destination_city'):
+        filters.append(LaneDailyRollup.destination_city == args['destination_city'])
+    if args.get('date_from'):
+        filters.append(LaneDailyRollup.day >= args['date_from'])
+    if args.get('date_to'):
+        filters.append(LaneDailyRollup.day <= args['date_to'])
+    return filters
+
+def _derived(totals):
+    shipments, amount_sum, revenue, delivered, on_time, transit_days_sum = totals
+    return {
+        'shipments': int(shipments),
+        'revenue': float(revenue),
+        'average_amount': float(amount_sum) / shipments if shipments else None,
+        'delivered': int(delivered),
+        'on_time_rate': float(on_time) / delivered if delivered else None,
+        'average_transit_days': float(transit_days_sum) / delivered if delivered else None
+    }
+
+def lane_summary(args, limit):
+    """Totals per lane over the filtered days, busiest lanes first."""
+    sums = [sa.func.sum(getattr(LaneDailyRollup, metric)) for metric in METRICS]
+    rows = db.session.execute(
+        sa.select(LaneDailyRollup.source_city, LaneDailyRollup.destination_city, *sums)
+        .where(*_rollup_filters(args))
+        .group_by(LaneDailyRollup.source_city, LaneDailyRollup.destination_city)
+        .order_by(sums[0].desc(), LaneDailyRollup.source_city, LaneDailyRollup.destination_city)
+        .limit(limit)
+    ).all()
+    return [{'source_city': row[0], 'destination_city': row[1], **_derived(row[2:])} for row in rows]
+
+def _rolling_sums(values, window):
+    # values: lanes x days x metrics; returns trailing `window`-day sums for every day
+    try:
+        # Imported here so workers only pay for numpy once someone asks for a rolling window
+        import numpy as np
+    except ImportError:
+        np = None
+    if np is not None:
+        cumulative = np.cumsum(np.asarray(values, dtype=float), axis=1)
+        shifted = np.zeros_like(cumulative)
+        if window < cumulative.shape[1]:
+            shifted[:, window:, :] = cumulative[:, :-window, :]
+        return (cumulative - shifted).tolist()
+    result = []
+    for lane in values:
+        running = [0.0] * len(METRICS)
+        sums = []
+        for index, day in enumerate(lane):
+            running = [total + value for total, value in zip(running, day)]
+            if index >= window:
+                running = [total - value for total, value in zip(running, lane[index - window])]
+            sums.append(running)
+        result.append(sums)
+    return result
+
+def lane_series(args, limit, date_from, date_to, window=None):
+    """Daily metrics for the busiest lanes between two dates, with optional trailing-window totals.
+
+    Days without shipments are filled with zeros so every lane has one
+    entry per day and windows line up across lanes.
+    """
+    lanes = lane_summary({**args, 'date_from': date_from, 'date_to': date_to}, limit)
+    if not lanes:
+        return []
+    days = [date_from + datetime.timedelta(days=offset) for offset in range((date_to - date_from).days + 1)]
+    # Windows reach back before date_from, so load that history too
+    history_from = date_from - datetime.timedelta(days=(window or 1) - 1)
+    lane_index = {(lane['source_city'], lane['destination_city']): i for i, lane in enumerate(lanes)}
+    all_days = [history_from + datetime.timedelta(days=offset) for offset in range((date_to - history_from).days + 1)]
+    day_index = {day: i for i, day in enumerate(all_days)}
+
+    rows = db.session.execute(
+        sa.select(LaneDailyRollup.source_city, LaneDailyRollup.destination_city, LaneDailyRollup.day,
+                  *[getattr(LaneDailyRollup, metric) for metric in METRICS])
+        .where(sa.tuple_(LaneDailyRollup.source_city, LaneDailyRollup.destination_city).in_(list(lane_index)),
+               LaneDailyRollup.day >= history_from, LaneDailyRollup.day <= date_to)
+    ).all()
+    values = [[[0.0] * len(METRICS) for _ in all_days] for _ in lanes]
+    for row in rows:
+        values[lane_index[(row[0], row[1])]][day_index[row[2]]] = list(row[3:])
+    windows = _rolling_sums(values, window) if window else None
+
+    offset = len(all_days) - len(days)
+    for i, lane in enumerate(lanes):
+        series = []
+        for j, day in enumerate(days):
+            entry = {'day': day.isoformat(), **_derived(values[i][offset + j])}
+            if windows:
+                entry['window'] = _derived(windows[i][offset + j])
+            series.append(entry)
+        lane['days'] = series
+    return lanes
@@ -0,0 +1,85 @@
+import datetime
+import logging
+import time
+import sqlalchemy as sa
+from flask import current_app
+from application.analytics import has_pending_refresh, schedule_refresh
+from application.changes import allocate_revisions
+from application.database import db
+from application.jobs import job_handler, schedule_once
+from application.models import Transaction, TransactionArchive
+
+logger = logging.getLogger(__name__)
+
+def archive_cutoff():
+    days = current_app.config.get('ARCHIVE_AFTER_DAYS', 180)
+    return datetime.date.today() - datetime.timedelta(days=days)
+
+def _archivable(cutoff):
+    # Finished shipments only; anything still moving or unpaid stays hot
+    return sa.and_(Transaction.delivery_status == 'delivered', Transaction.internal_status == 'paid',
+                   Transaction.date < cutoff)
+
+def archive_batch(batch_size=None):
+    """Move one batch of old delivered and paid transactions into the archive; returns how many moved.
+
+    The copy and the delete use the same predicate in one transaction, so a
+    row that stops qualifying concurrently stays in the hot table.
+    """
+    batch_size = batch_size or current_app.config.get('ARCHIVE_BATCH_SIZE', 1000)
+    cutoff = archive_cutoff()
+    # Transaction ids are AUTOINCREMENT on SQLite (and a sequence on PostgreSQL), so moved ids are never reused
+    ids = db.session.execute(
+        sa.select(Transaction.id).where(_archivable(cutoff))
+        .order_by(Transaction.id).limit(batch_size).with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not ids:
+        db.session.commit()
+        return 0
+
+    table = Transaction.__table__
+    names = [column.name for column in table.columns]
+    moving = sa.and_(Transaction.id.in_(ids), _archivable(cutoff))
+    copied = db.session.execute(sa.insert(TransactionArchive).from_select(
+        names + ['archived_at'],
+        sa.select(*[table.c[name] for name in names], sa.literal(datetime.datetime.utcnow())).where(moving)
+    )).rowcount
+    deleted = db.session.execute(
+        sa.delete(Transaction).where(moving).execution_options(synchronize_session=False)
+    ).rowcount
+    if copied != deleted:
+        db.session.rollback()
+        logger.warning('Archive batch copied %s rows but deleted %s; rolled back', copied, deleted)
+        return 0
+    # Cached list responses are keyed on the change-feed revision, so bump it once per batch
+    allocate_revisions(db.session, 1)
+    db.session.commit()
+    return deleted
+
+def archive_transactions(time_limit=None):
+    """Run archive batches until nothing is left or `time_limit` seconds pass; returns (moved, more_left)."""
+    deadline = time.monotonic() + time_limit if time_limit else None
+    moved = 0
+    while True:
+        count = archive_batch()
+        moved += count
+        if not count:
+            return moved, False
+        if deadline and time.monotonic() > deadline:
+            return moved, True
+
+def schedule_archiving(delay=0):
+    schedule_once('archive_transactions', delay)
+
+@job_handler('archive_transactions')
+def archive_job(payload):
+    # Finish well inside the job's lease; a follow-up run picks up the rest
+    time_limit = current_app.config.get('JOB_VISIBILITY_TIMEOUT', 60) / 2
+    moved, more = archive_transactions(time_limit)
+    if moved and has_pending_refresh():
+        # Moved rows still count in lane analytics; the refresh just confirms their totals
+        schedule_refresh()
+    interval = current_app.config.get('ARCHIVE_INTERVAL_MINUTES', 60) * 60
+    if more or interval:
+        schedule_archiving(0 if more else interval)
+    return {'archived': moved}
@@ -0,0 +1,181 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask_security import SQLAlchemyUserDatastore
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from application.models import User, Role
+
+class LocalBackend:
+    """In-process LRU with a per-entry TTL."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class SQLiteBackend:
+    """File-backed cache shared by every worker process on the host."""
+
+    def __init__(self, path, max_size, ttl):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS auth_cache '
+                         '(key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value BLOB NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            # Connections must not be shared across a fork
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT value FROM auth_cache WHERE key = ? AND expires_at >= ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value):
+        conn = self._connect()
+        conn.execute('INSERT OR REPLACE INTO auth_cache (key, expires_at, value) VALUES (?, ?, ?)',
+                     (key, time.time() + self.ttl, value))
+        conn.execute('DELETE FROM auth_cache WHERE expires_at < ?', (time.time(),))
+        conn.execute('DELETE FROM auth_cache WHERE key NOT IN '
+                     '(SELECT key FROM auth_cache ORDER BY expires_at DESC LIMIT ?)', (self.max_size,))
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM auth_cache WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connect().execute('DELETE FROM auth_cache')
+
+class UserCache:
+    """Caches authenticated users (with roles) by fs_uniquifier.
+
+    Users are stored pickled and detached, and re-attached to the request's
+    session with merge(load=False), so a hit costs no SQL at all.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        if not app.config.get('AUTH_CACHE_ENABLED', True):
+            self.backend = None
+            return
+        ttl = app.config.get('AUTH_CACHE_TTL', 30)
+        max_size = app.config.get('AUTH_CACHE_SIZE', 1024)
+        path = app.config.get('AUTH_CACHE_SQLITE_PATH')
+        self.backend = SQLiteBackend(path, max_size, ttl) if path else LocalBackend(max_size, ttl)
+
+    def get(self, fs_uniquifier):
+        if self.backend is None:
+            return None
+        value = self.backend.get(fs_uniquifier)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(value)
+
+    def set(self, user):
+        if self.backend is None:
+            return
+        # Roles are needed on every request for has_role(); load them before detaching
+        user.roles
+        self.backend.set(user.fs_uniquifier, pickle.dumps(user))
+
+    def delete(self, fs_uniquifier):
+        if self.backend is not None:
+            self.backend.delete(fs_uniquifier)
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+user_cache = UserCache()
+
+class CachedUserDatastore(SQLAlchemyUserDatastore):
+    """User datastore that serves token/session user lookups from user_cache."""
+
+    def find_user(self, case_insensitive=False, **kwargs):
+        if case_insensitive or list(kwargs) != ['fs_uniquifier']:
+            return super().find_user(case_insensitive=case_insensitive, **kwargs)
+
+        cached = user_cache.get(kwargs['fs_uniquifier'])
+        if cached is not None:
+            return self.db.session.merge(cached, load=False)
+
+        user = super().find_user(**kwargs)
+        if user is not None and user.active:
+            user_cache.set(user)
+        return user
+
+@event.listens_for(Session, 'after_flush')
+def _collect_auth_changes(session, flush_context):
+    evict = session.info.setdefault('auth_cache_evict', set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Role):
+            # A renamed or deleted role can affect any user
+            session.info['auth_cache_clear'] = True
+        elif isinstance(obj, User):
+            # Covers password, active flag, role membership and token revocation
+            # (which rotates fs_uniquifier, so evict the old key too)
+            history = inspect(obj).attrs.fs_uniquifier.history
+            evict.update(value for value in history.deleted if value)
+            if obj.fs_uniquifier:
+                evict.add(obj.fs_uniquifier)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_auth_changes(session):
+    evict = session.info.pop('auth_cache_evict', None)
+    if session.info.pop('auth_cache_clear', False):
+        user_cache.clear()
+    elif evict:
+        for fs_uniquifier in evict:
+            user_cache.delete(fs_uniquifier)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_auth_changes(session):
+    session.info.pop('auth_cache_evict', None)
+    session.info.pop('auth_cache_clear', None)
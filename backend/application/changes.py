@@ -0,0 +1,83 @@
+import datetime
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from application.database import db
+from application.models import ChangeCounter, Transaction, TransactionTombstone
+from application.serializers import serialize_rows, transaction_select
+
+COUNTER_ID = 1
+
+def allocate_revisions(session, count):
+    """Reserve `count` consecutive revisions and return the first one.
+
+    The counter row stays locked until the surrounding transaction commits,
+    so revisions become visible in the order they were handed out and a
+    client polling with ?since= can never skip past an uncommitted change.
+    """
+    connection = session.connection()
+    table = ChangeCounter.__table__
+    result = connection.execute(
+        update(table).where(table.c.id == COUNTER_ID).values(value=table.c.value + count)
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(id=COUNTER_ID, value=count))
+        return 1
+    last = connection.execute(select(table.c.value).where(table.c.id == COUNTER_ID)).scalar()
+    return last - count + 1
+
+def current_revision():
+    value = db.session.execute(select(ChangeCounter.value).where(ChangeCounter.id == COUNTER_ID)).scalar()
+    return value or 0
+
+def ensure_counter():
+    if db.session.get(ChangeCounter, COUNTER_ID) is None:
+        db.session.add(ChangeCounter(id=COUNTER_ID, value=0))
+        db.session.commit()
+
+@event.listens_for(Session, 'before_flush')
+def _stamp_revisions(session, flush_context, instances):
+    changed = [obj for obj in list(session.new) + list(session.dirty)
+               if isinstance(obj, Transaction) and (obj in session.new or session.is_modified(obj))]
+    deleted = [obj for obj in session.deleted if isinstance(obj, Transaction)]
+    if not changed and not deleted:
+        return
+
+    now = datetime.datetime.utcnow()
+    revision = allocate_revisions(session, len(changed) + len(deleted))
+    for obj in changed:
+        obj.revision = revision
+        obj.updated_at = now
+        revision += 1
+    for obj in deleted:
+        session.add(TransactionTombstone(transaction_id=obj.id, user_id=obj.user_id,
+                                         revision=revision, deleted_at=now))
+        revision += 1
+
+def changes_since(since, limit, user_id=None):
+    """Return (changes, next cursor, has_more) for revisions after `since`.
+
+    Changes are payload dicts, upserts for Transaction rows and deletes for
+    TransactionTombstone rows, interleaved in revision order. Both are
+    selected as plain tuples, so the result stays usable after the session
+    is rolled back and building it runs no further queries.
+    """
+    transactions = transaction_select().where(Transaction.revision > since)
+    tombstones = select(TransactionTombstone.revision, TransactionTombstone.transaction_id).where(
+        TransactionTombstone.revision > since
+    )
+    if user_id is not None:
+        transactions = transactions.where(Transaction.user_id == user_id)
+        tombstones = tombstones.where(TransactionTombstone.user_id == user_id)
+    rows = db.session.execute(transactions.order_by(Transaction.revision).limit(limit + 1)).all()
+    deleted = db.session.execute(tombstones.order_by(TransactionTombstone.revision).limit(limit + 1)).all()
+
+    # Merge the two revision-ordered streams and keep the first `limit`
+    merged = sorted(
+        [{'op': 'upsert', 'revision': item['revision'], 'transaction': item} for item in serialize_rows(rows)]
+        + [{'op': 'delete', 'revision': revision, 'id': transaction_id} for revision, transaction_id in deleted],
+        key=lambda change: change['revision']
+    )
+    has_more = len(merged) > limit
+    merged = merged[:limit]
+    cursor = merged[-1]['revision'] if merged else since
+    return merged, cursor, has_more
@@ -0,0 +1,110 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from application.database import db
+
+def init_db():
+    """Create missing tables, upgrade legacy ones and build the search index. Safe to re-run."""
+    # Only `db-init` needs the migration machinery, so web workers never import it
+    from application.changes import ensure_counter
+    from application.migrations import ensure_sqlite_autoincrement, migrate_transaction_table
+    from application.search import ensure_search_index
+    from application.analytics import ensure_lane_rollups
+    from application.archive import schedule_archiving
+    from application.jobs import schedule_once
+
+    db.create_all()
+    migrate_transaction_table()
+    ensure_sqlite_autoincrement()
+    # create_all skips existing tables, so add indexes introduced since they were created
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+    ensure_counter()
+    ensure_search_index()
+    ensure_lane_rollups()
+    if current_app.config.get('IDEMPOTENCY_PURGE_INTERVAL_MINUTES', 60):
+        schedule_once('purge_idempotency_keys')
+    if current_app.config.get('ARCHIVE_INTERVAL_MINUTES', 60):
+        # The archive job reschedules itself after each run; this (re)starts the cycle
+        schedule_archiving()
+    if current_app.config.get('ANALYTICS_REFRESH_INTERVAL_MINUTES', 5):
+        schedule_once('analytics_refresh')
+
+def seed_db():
+    """Create the default roles and demo accounts if they don't exist yet."""
+    from application.passwords import password_hasher
+
+    datastore = current_app.security.datastore
+    datastore.find_or_create_role(name='admin', description='Super user of app')
+    datastore.find_or_create_role(name='user', description='Normal user of app')
+    db.session.commit()
+
+    if not datastore.find_user(email='user0@admin.com'):
+        datastore.create_user(
+            email='user0@admin.com',
+            username='admin01',
+            password=password_hasher.hash('1234'),
+            roles=['admin', 'user']
+        )
+    if not datastore.find_user(email='user01@user.com'):
+        datastore.create_user(
+            email='user01@user.com',
+            username='user01',
+            password=password_hasher.hash('1234'),
+            roles=['user']
+        )
+    db.session.commit()
+
+@click.command('db-init')
+@with_appcontext
+def db_init_command():
+    """Create or upgrade the database schema."""
+    init_db()
+    click.echo('Database initialised')
+
+@click.command('seed')
+@with_appcontext
+def seed_command():
+    """Create default roles and users."""
+    seed_db()
+    click.echo('Default roles and users created')
+
+@click.command('jobs-worker')
+@click.option('--threads', type=int, default=None, help='Concurrent jobs (defaults to JOB_WORKER_THREADS).')
+@with_appcontext
+def jobs_worker_command(threads):
+    """Run queued background jobs until interrupted."""
+    from application.jobs import job_worker
+
+    click.echo('Running background jobs, press Ctrl+C to stop')
+    job_worker.run(threads)
+
+@click.command('analytics-refresh')
+@click.option('--rebuild', is_flag=True, help='Recompute every rollup instead of only touched lanes and days.')
+@with_appcontext
+def analytics_refresh_command(rebuild):
+    """Bring the lane analytics rollups up to date."""
+    from application.analytics import rebuild_lane_rollups, refresh_all_lane_rollups
+
+    if rebuild:
+        rebuild_lane_rollups()
+        click.echo('Lane rollups rebuilt')
+    else:
+        click.echo(f'Refreshed {refresh_all_lane_rollups()} lane/day keys')
+
+@click.command('archive')
+@with_appcontext
+def archive_command():
+    """Move old delivered and paid transactions into the archive table."""
+    from application.archive import archive_cutoff, archive_transactions
+
+    moved, _ = archive_transactions()
+    click.echo(f'Archived {moved} transactions dated before {archive_cutoff().isoformat()}')
+
+def register_commands(app):
+    app.cli.add_command(db_init_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(jobs_worker_command)
+    app.cli.add_command(analytics_refresh_command)
+    app.cli.add_command(archive_command)
@@ -1,4 +1,9 @@
+import logging
 import os
+import tempfile
+from application.database import TimedQueuePool
+
+logger = logging.getLogger(__name__)
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key-here'
@@ -9,27 +14,133 @@ class Config:
     SECURITY_SEND_REGISTER_EMAIL = False
     SECURITY_UNAUTHORIZED_VIEW = None
     WTF_CSRF_ENABLED = False
+    TRANSACTIONS_PAGE_SIZE = int(os.environ.get('TRANSACTIONS_PAGE_SIZE', 50))
+    TRANSACTIONS_MAX_PAGE_SIZE = int(os.environ.get('TRANSACTIONS_MAX_PAGE_SIZE', 500))
+    BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 1000))
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+    AUTH_CACHE_ENABLED = os.environ.get('AUTH_CACHE_ENABLED', 'true').lower() == 'true'
+    # Commits evict changed users only in the committing process (and the shared file below, if set), so role,
+    # password and deactivation changes made from the CLI or another worker take up to this long to apply
+    AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', 30))
+    AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', 1024))
+    # Point every gunicorn worker at the same file to share the cache between them
+    AUTH_CACHE_SQLITE_PATH = os.environ.get('AUTH_CACHE_SQLITE_PATH')
+    IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+    # How often expired keys are deleted in the background; 0 disables
+    IDEMPOTENCY_PURGE_INTERVAL_MINUTES = int(os.environ.get('IDEMPOTENCY_PURGE_INTERVAL_MINUTES', 60))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    # Log requests slower than this (with their SQL); 0 disables
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 0))
+    CHANGES_POLL_SECONDS = float(os.environ.get('CHANGES_POLL_SECONDS', 2))
+    # Streams end (and clients reconnect) after this many seconds; keep it below gunicorn's timeout
+    CHANGES_STREAM_TIMEOUT = int(os.environ.get('CHANGES_STREAM_TIMEOUT', 25))
+    # Per-worker memory for cached JSON responses (0 disables), and the largest single body worth keeping
+    RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRY_BYTES', 1024 * 1024))
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 3600))
+    JOB_WORKER_THREADS = int(os.environ.get('JOB_WORKER_THREADS', 2))
+    JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', 1))
+    JOB_VISIBILITY_TIMEOUT = int(os.environ.get('JOB_VISIBILITY_TIMEOUT', 60))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+    JOB_RETRY_BASE_SECONDS = float(os.environ.get('JOB_RETRY_BASE_SECONDS', 2))
+    JOB_RETRY_MAX_SECONDS = float(os.environ.get('JOB_RETRY_MAX_SECONDS', 300))
+    # Any werkzeug method string, e.g. scrypt:32768:8:1 or pbkdf2:sha256:600000; users are rehashed on their next login
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    # Keep workers + queue below GUNICORN_THREADS so a login burst leaves threads free for other requests
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 4))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+    # Host-wide cap on concurrent hashes, shared by every worker through lock files in this directory ('' disables)
+    PASSWORD_HASH_LOCK_DIR = os.environ.get('PASSWORD_HASH_LOCK_DIR', os.path.join(tempfile.gettempdir(), 'logitrack-password-hash'))
+    PASSWORD_HASH_HOST_SLOTS = int(os.environ.get('PASSWORD_HASH_HOST_SLOTS', os.cpu_count() or 2))
+    PASSWORD_HASH_HOST_QUEUE = int(os.environ.get('PASSWORD_HASH_HOST_QUEUE', 8))
+    # Token buckets per client and endpoint class: sustained requests per minute and burst size; 0 disables a class
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_READ_PER_MINUTE = int(os.environ.get('RATE_LIMIT_READ_PER_MINUTE', 600))
+    RATE_LIMIT_READ_BURST = int(os.environ.get('RATE_LIMIT_READ_BURST', 100))
+    RATE_LIMIT_WRITE_PER_MINUTE = int(os.environ.get('RATE_LIMIT_WRITE_PER_MINUTE', 120))
+    RATE_LIMIT_WRITE_BURST = int(os.environ.get('RATE_LIMIT_WRITE_BURST', 30))
+    RATE_LIMIT_AUTH_PER_MINUTE = int(os.environ.get('RATE_LIMIT_AUTH_PER_MINUTE', 10))
+    RATE_LIMIT_AUTH_BURST = int(os.environ.get('RATE_LIMIT_AUTH_BURST', 5))
+    # Point every gunicorn worker at the same file to share the buckets between them
+    RATE_LIMIT_SQLITE_PATH = os.environ.get('RATE_LIMIT_SQLITE_PATH')
+    # Requests served at once before answering 503; 0 disables
+    MAX_CONCURRENT_REQUESTS = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 32))
+    # Lock files that make MAX_CONCURRENT_REQUESTS a cap for all workers on the host ('' caps each worker separately)
+    MAX_CONCURRENT_LOCK_DIR = os.environ.get('MAX_CONCURRENT_LOCK_DIR', os.path.join(tempfile.gettempdir(), 'logitrack-requests'))
+    # Change streams and exports open at once, capped apart from MAX_CONCURRENT_REQUESTS; keep it below the gunicorn threads
+    MAX_CONCURRENT_STREAMS = int(os.environ.get('MAX_CONCURRENT_STREAMS', 4))
+    # Reverse proxies in front of the app whose X-Forwarded-For/-Proto can be trusted; 0 uses the socket address
+    PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS', 0))
+    # Delivered and paid shipments older than this many days are moved to the archive table
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 180))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 1000))
+    # How often the background archive pass runs; 0 leaves it to `flask archive`
+    ARCHIVE_INTERVAL_MINUTES = int(os.environ.get('ARCHIVE_INTERVAL_MINUTES', 60))
+    # Delivered within this many days of the shipment date counts as on time; rebuild rollups after changing it
+    ANALYTICS_ON_TIME_DAYS = int(os.environ.get('ANALYTICS_ON_TIME_DAYS', 5))
+    ANALYTICS_REFRESH_BATCH = int(os.environ.get('ANALYTICS_REFRESH_BATCH', 5000))
+    # How often the rollup refresh job drains touched lanes and days; 0 leaves refreshes to analytics reads
+    ANALYTICS_REFRESH_INTERVAL_MINUTES = int(os.environ.get('ANALYTICS_REFRESH_INTERVAL_MINUTES', 5))
+    ANALYTICS_MAX_LANES = int(os.environ.get('ANALYTICS_MAX_LANES', 200))
+    ANALYTICS_MAX_DAYS = int(os.environ.get('ANALYTICS_MAX_DAYS', 366))
+
+def engine_options(database_uri):
+    """Pool and driver settings for SQLALCHEMY_ENGINE_OPTIONS."""
+    if database_uri.startswith('sqlite') and (database_uri.endswith(':memory:') or database_uri == 'sqlite://'):
+        # In-memory SQLite uses a single static connection; pool options don't apply
+        return {}
+
+    # Size the pool per worker so workers * (pool + overflow) stays under the server limit
+    max_connections = int(os.environ.get('DB_MAX_CONNECTIONS', 0))
+    workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+    if max_connections:
+        pool_size = max(1, max_connections // workers)
+        max_overflow = 0
+    else:
+        pool_size = int(os.environ.get('DB_POOL_SIZE', 5))
+        max_overflow = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True
+    }
+    statement_timeout = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+    if database_uri.startswith('postgresql') and statement_timeout:
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+    return options
+
+def database_uri():
+    # Get DATABASE_URL from environment, fallback to SQLite if not provided or invalid
+    database_url = os.environ.get('DATABASE_URL')
+    # Only worth warning about when this config is actually the one in use
+    warn = logger.warning if os.environ.get('FLASK_ENV') == 'production' else logger.debug
+    if not database_url:
+        warn('DATABASE_URL is not set; falling back to SQLite')
+        return 'sqlite:///logistics.db'
+
+    # Handle PostgreSQL URL format for Railway
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+
+    # Validate the URL format - check if it contains placeholder text
+    if 'username:password@host:port' in database_url or ':port/' in database_url:
+        warn('DATABASE_URL looks like a placeholder; falling back to SQLite')
+        return 'sqlite:///logistics.db'
+    return database_url
 
 class LocalDevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///logistics.db'
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
 
 class ProductionConfig(Config):
     DEBUG = False
-    # Get DATABASE_URL from environment, fallback to SQLite if not provided or invalid
-    database_url = os.environ.get('DATABASE_URL')
-    
-    if database_url:
-        # Handle PostgreSQL URL format for Railway
-        if database_url.startswith('postgres://'):
-            database_url = database_url.replace('postgres://', 'postgresql://', 1)
-        
-        # Validate the URL format - check if it contains placeholder text
-        if 'username:password@host:port' in database_url or ':port/' in database_url:
-            # Invalid placeholder URL, fallback to SQLite
-            SQLALCHEMY_DATABASE_URI = 'sqlite:///logistics.db'
-        else:
-            SQLALCHEMY_DATABASE_URI = database_url
-    else:
-        # No DATABASE_URL provided, use SQLite
-        SQLALCHEMY_DATABASE_URI = 'sqlite:///logistics.db'
\ No newline at end of file
+    # Railway and similar platforms terminate TLS at one proxy in front of gunicorn
+    PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS', 1))
+    SQLALCHEMY_DATABASE_URI = database_uri()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
\ No newline at end of file
@@ -1,3 +1,90 @@
+import threading
+import time
+from contextlib import contextmanager
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
 
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy()
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._wait_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._wait_lock:
+                self.checkouts += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+def configure_engine(app):
+    """Apply per-connection settings that can't be expressed as engine options."""
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+
+    busy_timeout = app.config.get('SQLITE_BUSY_TIMEOUT_MS', 5000)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers proceed alongside a writer; busy_timeout makes writers
+        # wait for the lock instead of failing with "database is locked"
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout)}')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+def pool_status(engine=None):
+    engine = engine or db.engine
+    pool = engine.pool
+    status = {'dialect': engine.dialect.name, 'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            'timeout': pool.timeout()
+        })
+    if isinstance(pool, TimedQueuePool):
+        status.update({
+            'checkouts': pool.checkouts,
+            'wait_seconds_total': round(pool.wait_seconds, 6),
+            'wait_seconds_max': round(pool.max_wait_seconds, 6),
+            'timeouts': pool.timeouts
+        })
+    return status
+
+@contextmanager
+def count_queries():
+    """Collect every SQL statement executed on the engine inside the block."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
@@ -0,0 +1,121 @@
+import datetime
+import hashlib
+import json
+from functools import wraps
+from flask import current_app, request
+from flask_security import current_user
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from application.database import db
+from application.jobs import job_handler, schedule_once
+from application.models import IdempotencyKey
+
+PURGE_BATCH_SIZE = 5000
+
+def key_ttl():
+    return datetime.timedelta(hours=current_app.config.get('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+def _request_hash(endpoint):
+    digest = hashlib.sha256()
+    digest.update(endpoint.encode())
+    digest.update(request.path.encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+def _split_response(response):
+    if isinstance(response, tuple):
+        body, status = response[0], response[1]
+        headers = response[2] if len(response) > 2 else {}
+        return body, status, headers
+    return response, 200, {}
+
+def idempotent(endpoint):
+    """Replay the stored response when a client retries with the same Idempotency-Key.
+
+    The key is claimed with an INSERT before the handler runs, so concurrent
+    retries race on the unique constraint rather than on row locks. Failed
+    requests release the key so they can be retried.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get('Idempotency-Key')
+            if not key:
+                return func(*args, **kwargs)
+            if len(key) > 255:
+                return {'error': 'Idempotency-Key is too long'}, 400
+
+            request_hash = _request_hash(endpoint)
+            record = IdempotencyKey.query.filter_by(user_id=current_user.id, key=key).first()
+            if record and record.created_at < datetime.datetime.utcnow() - key_ttl():
+                db.session.delete(record)
+                db.session.commit()
+                record = None
+
+            if record is None:
+                record = IdempotencyKey(key=key, user_id=current_user.id, endpoint=endpoint,
+                                        request_hash=request_hash)
+                db.session.add(record)
+                try:
+                    db.session.commit()
+                except IntegrityError:
+                    # Another request claimed the key first
+                    db.session.rollback()
+                    record = IdempotencyKey.query.filter_by(user_id=current_user.id, key=key).first()
+                else:
+                    return _run_and_store(record, func, args, kwargs)
+
+            if record.endpoint != endpoint or record.request_hash != request_hash:
+                return {'error': 'Idempotency-Key was already used for a different request'}, 422
+            if record.status_code is None:
+                return {'error': 'A request with this Idempotency-Key is still in progress'}, 409
+            return json.loads(record.response_body), record.status_code, {'Idempotent-Replayed': 'true'}
+        return wrapper
+    return decorator
+
+def _run_and_store(record, func, args, kwargs):
+    record_id = record.id
+    try:
+        response = func(*args, **kwargs)
+    except Exception:
+        _release(record_id)
+        raise
+
+    body, status, headers = _split_response(response)
+    record = db.session.get(IdempotencyKey, record_id)
+    if status >= 400 or record is None:
+        _release(record_id)
+        return response
+    record.status_code = status
+    record.response_body = json.dumps(body)
+    db.session.commit()
+    return body, status, headers
+
+def _release(record_id):
+    db.session.rollback()
+    IdempotencyKey.query.filter_by(id=record_id).delete()
+    db.session.commit()
+
+def purge_expired_keys():
+    """Delete keys older than IDEMPOTENCY_KEY_TTL_HOURS in batches; returns how many were removed."""
+    cutoff = datetime.datetime.utcnow() - key_ttl()
+    removed = 0
+    while True:
+        ids = db.session.execute(
+            select(IdempotencyKey.id).where(IdempotencyKey.created_at < cutoff).limit(PURGE_BATCH_SIZE)
+        ).scalars().all()
+        if not ids:
+            db.session.commit()
+            return removed
+        db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(ids)))
+        # Short transactions, so request threads claiming keys never wait long
+        db.session.commit()
+        removed += len(ids)
+
+@job_handler('purge_idempotency_keys')
+def purge_job(payload):
+    removed = purge_expired_keys()
+    interval = current_app.config.get('IDEMPOTENCY_PURGE_INTERVAL_MINUTES', 60) * 60
+    if interval:
+        schedule_once('purge_idempotency_keys', interval)
+    return {'removed': removed}
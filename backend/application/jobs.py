@@ -0,0 +1,212 @@
+import datetime
+import json
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import and_, or_, select, update
+from application.database import db
+from application.models import Job
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+class JobFailed(Exception):
+    """Raised by a handler to fail the job immediately instead of retrying it."""
+
+def job_handler(kind):
+    """Register `func(payload)` to run jobs of `kind`.
+
+    Handlers make their changes through db.session and return a JSON-able
+    result; the worker commits those changes in the same transaction that
+    marks the job succeeded, so a crash or retry never applies them twice.
+    """
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+    return decorator
+
+def enqueue(kind, payload, user_id=None, run_at=None):
+    """Queue a job and commit; workers in any process can pick it up from then on (or from `run_at`)."""
+    if kind not in _handlers:
+        raise ValueError(f'Unknown job kind: {kind}')
+    job = Job(kind=kind, payload=json.dumps(payload), user_id=user_id,
+              max_attempts=current_app.config.get('JOB_MAX_ATTEMPTS', 5),
+              run_at=run_at or datetime.datetime.utcnow())
+    db.session.add(job)
+    db.session.commit()
+    job_worker.wake()
+    return job
+
+def schedule_once(kind, delay=0, payload=None):
+    """Queue `kind` to run in `delay` seconds unless one is already waiting; for self-rescheduling periodic jobs."""
+    pending = db.session.execute(
+        select(Job.id).where(Job.kind == kind, Job.status == 'queued').limit(1)
+    ).first()
+    if pending is None:
+        run_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+        enqueue(kind, payload or {}, run_at=run_at)
+
+def serialize_job(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'run_at': job.run_at.isoformat(),
+        'created_at': job.created_at.isoformat(),
+        'updated_at': job.updated_at.isoformat()
+    }
+
+def _claimable(now):
+    return or_(and_(Job.status == 'queued', Job.run_at <= now),
+               and_(Job.status == 'running', Job.locked_until < now))
+
+def claim_jobs(limit):
+    """Lease up to `limit` due jobs to this worker and return their ids.
+
+    Each claim is a conditional UPDATE, so concurrent workers can race for
+    the same row without SELECT ... FOR UPDATE and only one of them wins.
+    """
+    now = datetime.datetime.utcnow()
+    timeout = datetime.timedelta(seconds=current_app.config.get('JOB_VISIBILITY_TIMEOUT', 60))
+    candidates = db.session.execute(
+        select(Job.id).where(_claimable(now)).order_by(Job.run_at, Job.id).limit(limit)
+    ).scalars().all()
+    claimed = []
+    for job_id in candidates:
+        result = db.session.execute(
+            update(Job).where(Job.id == job_id, _claimable(now))
+            .values(status='running', attempts=Job.attempts + 1, locked_until=now + timeout, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            claimed.append(job_id)
+    db.session.commit()
+    return claimed
+
+def _finish(job_id, attempt, **values):
+    # Only the worker still holding the lease may record the outcome
+    values['updated_at'] = datetime.datetime.utcnow()
+    result = db.session.execute(
+        update(Job).where(Job.id == job_id, Job.attempts == attempt, Job.status == 'running')
+        .values(locked_until=None, **values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.session.rollback()
+        logger.warning('Job %s lost its lease before finishing; discarding attempt %s', job_id, attempt)
+        return False
+    db.session.commit()
+    return True
+
+def retry_delay(attempt):
+    base = current_app.config.get('JOB_RETRY_BASE_SECONDS', 2)
+    cap = current_app.config.get('JOB_RETRY_MAX_SECONDS', 300)
+    # Exponential backoff with jitter so failed jobs don't retry in lockstep
+    return min(cap, base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+def run_job(job_id):
+    job = db.session.get(Job, job_id)
+    kind, payload, attempt, max_attempts = job.kind, job.payload, job.attempts, job.max_attempts
+    db.session.commit()
+
+    if attempt > max_attempts:
+        # Claimed again after its last attempt timed out
+        return _finish(job_id, attempt, status='failed', error='Visibility timeout expired on the final attempt')
+    try:
+        handler = _handlers.get(kind)
+        if handler is None:
+            raise JobFailed(f'No handler registered for job kind {kind}')
+        result = handler(json.loads(payload))
+        # Surface write conflicts here so they count as a failed attempt
+        db.session.flush()
+    except Exception as e:
+        db.session.rollback()
+        error = str(e) or e.__class__.__name__
+        if isinstance(e, JobFailed) or attempt >= max_attempts:
+            logger.warning('Job %s (%s) failed after %s attempt(s): %s', job_id, kind, attempt, error)
+            return _finish(job_id, attempt, status='failed', error=error)
+        run_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=retry_delay(attempt))
+        return _finish(job_id, attempt, status='queued', run_at=run_at, error=error)
+    return _finish(job_id, attempt, status='succeeded', result=json.dumps(result), error=None)
+
+class JobWorker:
+    """Runs due jobs on a thread pool inside the current process.
+
+    Every web worker runs one (started on its first request) unless
+    JOB_WORKER_THREADS is 0, in which case `flask jobs-worker` can run the
+    queue in a separate process. The table is the only coordination.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.threads = 0
+        self._busy = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._executor = None
+
+    def init_app(self, app):
+        self.app = app
+        self.threads = app.config.get('JOB_WORKER_THREADS', 2)
+        if self.threads > 0:
+            # No threads at import time or in CLI commands, only once serving
+            app.before_request(self.start)
+
+    def start(self):
+        if self._executor is not None:
+            return
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._executor = ThreadPoolExecutor(max(1, self.threads), thread_name_prefix='job')
+        threading.Thread(target=self._dispatch, name='job-dispatcher', daemon=True).start()
+
+    def run(self, threads=None):
+        """Run the dispatcher in the foreground (used by the CLI worker)."""
+        with self._lock:
+            self.threads = threads or self.threads or 1
+            self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='job')
+        self._dispatch()
+
+    def wake(self):
+        self._wake.set()
+
+    def _dispatch(self):
+        while True:
+            self._wake.wait(self.app.config.get('JOB_POLL_SECONDS', 1))
+            self._wake.clear()
+            with self._lock:
+                free = self.threads - self._busy
+            if free <= 0:
+                continue
+            try:
+                with self.app.app_context():
+                    job_ids = claim_jobs(free)
+            except Exception:
+                logger.exception('Claiming jobs failed')
+                continue
+            for job_id in job_ids:
+                with self._lock:
+                    self._busy += 1
+                self._executor.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        try:
+            with self.app.app_context():
+                run_job(job_id)
+        except Exception:
+            logger.exception('Job %s crashed the worker; it will be retried after its lease expires', job_id)
+        finally:
+            with self._lock:
+                self._busy -= 1
+            # A slot is free; look for more work straight away
+            self._wake.set()
+
+job_worker = JobWorker()
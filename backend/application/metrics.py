@@ -0,0 +1,176 @@
+import threading
+import time
+from flask import Response, g, has_request_context, request, got_request_exception
+from sqlalchemy import event
+from application.database import db, pool_status
+from application.response_cache import response_cache
+from application.passwords import password_hasher
+from application.ratelimit import rate_limiter
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, label_values)} {value}')
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            counts, total, count = self._values.get(label_values, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[label_values] = (counts, total + value, count + 1)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    labels = _format_labels(self.labels, label_values, [('le', bound)])
+                    lines.append(f'{self.name}_bucket{labels} {bucket_count}')
+                labels = _format_labels(self.labels, label_values, [('le', '+Inf')])
+                lines.append(f'{self.name}_bucket{labels} {count}')
+                labels = _format_labels(self.labels, label_values)
+                lines.append(f'{self.name}_sum{labels} {total}')
+                lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+# Metrics are per process; with several gunicorn workers each scrape sees one worker
+REQUESTS = Counter('http_requests_total', 'HTTP requests by endpoint, method and status',
+                   ('endpoint', 'method', 'status'))
+ERRORS = Counter('http_request_errors_total', 'HTTP responses with a 4xx/5xx status or an unhandled exception',
+                 ('endpoint', 'method', 'status'))
+LATENCY = Histogram('http_request_duration_seconds', 'Request latency', ('endpoint', 'method'))
+RESPONSE_SIZE = Histogram('http_response_size_bytes', 'Response body size', ('endpoint', 'method'),
+                          buckets=SIZE_BUCKETS)
+QUERY_COUNT = Histogram('db_queries_per_request', 'SQL statements executed per request', ('endpoint', 'method'),
+                        buckets=QUERY_BUCKETS)
+QUERY_TIME = Histogram('db_query_duration_seconds_per_request', 'Time spent in SQL per request',
+                       ('endpoint', 'method'))
+
+def _endpoint_label():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+def render_metrics():
+    lines = []
+    for metric in (REQUESTS, ERRORS, LATENCY, RESPONSE_SIZE, QUERY_COUNT, QUERY_TIME):
+        lines.extend(metric.render())
+    for key in ('hits', 'misses', 'not_modified'):
+        lines.append(f'# TYPE response_cache_{key}_total counter')
+        lines.append(f'response_cache_{key}_total {getattr(response_cache, key)}')
+    lines.append('# TYPE password_hash_in_flight gauge')
+    lines.append(f'password_hash_in_flight {password_hasher.in_flight}')
+    lines.append('# TYPE password_hash_rejected_total counter')
+    lines.append(f'password_hash_rejected_total {password_hasher.rejected}')
+    # Rejected requests never reach the metrics request hooks, so they are counted here
+    lines.append('# TYPE rate_limited_requests_total counter')
+    for limit_class, count in rate_limiter.limited.items():
+        lines.append(f'rate_limited_requests_total{{class="{limit_class}"}} {count}')
+    lines.append('# TYPE requests_shed_total counter')
+    lines.append(f'requests_shed_total {rate_limiter.shed}')
+    lines.append('# TYPE requests_in_flight gauge')
+    lines.append(f'requests_in_flight {rate_limiter.in_flight}')
+    lines.append('# TYPE streams_in_flight gauge')
+    lines.append(f'streams_in_flight {rate_limiter.streams_in_flight}')
+    for key, value in pool_status().items():
+        if isinstance(value, (int, float)):
+            lines.append(f'# TYPE db_pool_{key} gauge')
+            lines.append(f'db_pool_{key} {value}')
+    return '\n'.join(lines) + '\n'
+
+def init_metrics(app):
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _end_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        if has_request_context() and 'metrics_start' in g:
+            g.sql_count += 1
+            g.sql_time += elapsed
+            if g.sql_statements is not None:
+                g.sql_statements.append((round(elapsed * 1000, 2), statement))
+
+    @app.before_request
+    def _start_request():
+        g.metrics_start = time.perf_counter()
+        g.sql_count = 0
+        g.sql_time = 0.0
+        # Statements are only kept when the slow request log is on
+        g.sql_statements = [] if app.config.get('SLOW_REQUEST_MS') else None
+
+    @app.after_request
+    def _record_request(response):
+        if 'metrics_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.metrics_start
+        endpoint = _endpoint_label()
+        method = request.method
+        REQUESTS.inc(endpoint, method, str(response.status_code))
+        if response.status_code >= 400:
+            ERRORS.inc(endpoint, method, str(response.status_code))
+        LATENCY.observe(elapsed, endpoint, method)
+        QUERY_COUNT.observe(g.sql_count, endpoint, method)
+        QUERY_TIME.observe(g.sql_time, endpoint, method)
+        # Streamed responses have no length up front
+        if not response.is_streamed:
+            RESPONSE_SIZE.observe(response.calculate_content_length() or 0, endpoint, method)
+
+        slow_ms = app.config.get('SLOW_REQUEST_MS')
+        if slow_ms and elapsed * 1000 >= slow_ms:
+            app.logger.warning(
+                'Slow request %s %s: %.1f ms, %d queries (%.1f ms in SQL)\n%s',
+                method, request.full_path, elapsed * 1000, g.sql_count, g.sql_time * 1000,
+                '\n'.join(f'  [{ms} ms] {statement}' for ms, statement in g.sql_statements)
+            )
+        return response
+
+    def _record_exception(sender, exception, **extra):
+        ERRORS.inc(_endpoint_label(), request.method, 'exception')
+
+    got_request_exception.connect(_record_exception, app, weak=False)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus metrics for this worker"""
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
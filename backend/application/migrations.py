@@ -0,0 +1,148 @@
+import datetime
+import logging
+import sqlalchemy as sa
+from sqlalchemy.schema import CreateColumn
+from application.database import db
+from application.models import Transaction, TransactionArchive, DELIVERY_STATUSES, INTERNAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+LEGACY_TABLE = 'transaction_legacy'
+BATCH_SIZE = 1000
+
+def parse_legacy_date(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime.date):
+        return value
+    value = str(value).strip()
+    try:
+        return datetime.date.fromisoformat(value[:10])
+    except ValueError:
+        return None
+
+def normalize_status(value, allowed, default):
+    if value in allowed:
+        return value
+    key = str(value or '').strip().lower().replace(' ', '_')
+    for status in allowed:
+        if status.lower().replace(' ', '_') == key:
+            return status
+    return default
+
+def add_missing_columns(engine, table, existing):
+    # New columns must be nullable or carry a server_default for this to work on populated tables
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                conn.execute(sa.text(f'ALTER TABLE {quote(table.name)} ADD COLUMN {ddl}'))
+
+def migrate_transaction_table(engine=None):
+    """Upgrade a pre-typed transaction table (string dates/statuses, no indexes) in place.
+
+    The old table is renamed, recreated from the model and copied across in
+    batches, so the same path works on SQLite and PostgreSQL. Returns True if
+    rows were migrated.
+    """
+    engine = engine or db.engine
+    table = Transaction.__table__
+    inspector = sa.inspect(engine)
+    if not inspector.has_table(table.name):
+        return False
+
+    columns = {column['name']: column for column in inspector.get_columns(table.name)}
+    if isinstance(columns['date']['type'], sa.Date):
+        # Already typed; just add columns and indexes introduced since
+        add_missing_columns(engine, table, columns)
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+        return False
+
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as conn:
+        conn.execute(sa.text(f'ALTER TABLE {quote(table.name)} RENAME TO {quote(LEGACY_TABLE)}'))
+        table.create(bind=conn)
+        legacy = sa.Table(LEGACY_TABLE, sa.MetaData(), autoload_with=conn)
+
+        last_id = 0
+        undated = []
+        while True:
+            rows = conn.execute(
+                sa.select(legacy).where(legacy.c.id > last_id).order_by(legacy.c.id).limit(BATCH_SIZE)
+            ).mappings().all()
+            if not rows:
+                break
+            batch = []
+            for row in rows:
+                date = parse_legacy_date(row['date'])
+                if date is None:
+                    undated.append(row['id'])
+                    date = datetime.date.today()
+                batch.append({
+                    'id': row['id'],
+                    'name': row['name'],
+                    'user_id': row['user_id'],
+                    'type': row['type'],
+                    'date': date,
+                    'delivery_date': parse_legacy_date(row['delivery_date']),
+                    'source_city': row['source_city'],
+                    'destination_city': row['destination_city'],
+                    'internal_status': normalize_status(row['internal_status'], INTERNAL_STATUSES, 'requested'),
+                    'delivery_status': normalize_status(row['delivery_status'], DELIVERY_STATUSES, 'processing'),
+                    'description': row['description'],
+                    'amount': row['amount']
+                })
+            conn.execute(table.insert(), batch)
+            last_id = rows[-1]['id']
+
+        conn.execute(sa.text(f'DROP TABLE {quote(LEGACY_TABLE)}'))
+        if engine.dialect.name == 'postgresql':
+            # Explicit ids were copied, so move the new serial past them
+            conn.execute(sa.text(
+                f"SELECT setval(pg_get_serial_sequence('{quote(table.name)}', 'id'), "
+                f"COALESCE((SELECT MAX(id) FROM {quote(table.name)}), 1))"
+            ))
+
+    if undated:
+        logger.warning('Transactions with unparseable dates were set to today: %s', undated)
+    return True
+
+def ensure_sqlite_autoincrement(engine=None):
+    """Rebuild a SQLite transaction table created without AUTOINCREMENT; returns True if it was rebuilt.
+
+    Plain SQLite rowids restart from max(id) + 1, so once the newest rows
+    are archived their ids would be handed out again. Triggers are dropped
+    with the old table; ensure_search_index and ensure_lane_rollups put
+    them back.
+    """
+    engine = engine or db.engine
+    table = Transaction.__table__
+    if engine.dialect.name != 'sqlite' or not sa.inspect(engine).has_table(table.name):
+        return False
+
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.begin() as conn:
+        ddl = conn.execute(sa.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                           {'name': table.name}).scalar()
+        if 'AUTOINCREMENT' in ddl.upper():
+            return False
+        # Indexes follow a renamed table, so drop them before the new table recreates them
+        for index in sa.inspect(conn).get_indexes(table.name):
+            conn.execute(sa.text(f'DROP INDEX {quote(index["name"])}'))
+        conn.execute(sa.text(f'ALTER TABLE {quote(table.name)} RENAME TO {quote(LEGACY_TABLE)}'))
+        table.create(bind=conn)
+        columns = ', '.join(quote(column.name) for column in table.columns)
+        conn.execute(sa.text(f'INSERT INTO {quote(table.name)} ({columns}) SELECT {columns} FROM {quote(LEGACY_TABLE)}'))
+        conn.execute(sa.text(f'DROP TABLE {quote(LEGACY_TABLE)}'))
+
+        # Ids already moved to the archive may be above anything left in the hot table
+        high_water = conn.execute(sa.select(sa.func.max(Transaction.id))).scalar() or 0
+        if sa.inspect(conn).has_table(TransactionArchive.__tablename__):
+            high_water = max(high_water, conn.execute(sa.select(sa.func.max(TransactionArchive.id))).scalar() or 0)
+        conn.execute(sa.text('DELETE FROM sqlite_sequence WHERE name = :name'), {'name': table.name})
+        conn.execute(sa.text('INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)'),
+                     {'name': table.name, 'seq': high_water})
+    logger.info('Rebuilt %s with AUTOINCREMENT ids', table.name)
+    return True
@@ -1,3 +1,4 @@
+import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_security import UserMixin, RoleMixin
 from application.database import db
@@ -22,18 +23,153 @@ class User(db.Model, UserMixin):
     fs_uniquifier = db.Column(db.String(255), unique=True, nullable=False)
     roles = db.relationship('Role', secondary=roles_users, backref=db.backref('users', lazy='dynamic'))
 
+DELIVERY_STATUSES = ('processing', 'pending', 'in_transit', 'delivered', 'cancelled')
+INTERNAL_STATUSES = ('requested', 'Payment Pending', 'paid')
+JOB_STATUSES = ('queued', 'running', 'succeeded', 'failed')
+
 class Transaction(db.Model):
+    __table_args__ = (
+        db.Index('ix_transaction_user_id_id', 'user_id', 'id'),
+        db.Index('ix_transaction_user_id_date', 'user_id', 'date'),
+        db.Index('ix_transaction_delivery_status_date', 'delivery_status', 'date'),
+        db.Index('ix_transaction_internal_status_date', 'internal_status', 'date'),
+        db.Index('ix_transaction_revision', 'revision'),
+        db.Index('ix_transaction_user_id_revision', 'user_id', 'revision'),
+        db.Index('ix_transaction_lane_date', 'source_city', 'destination_city', 'date'),
+        # Never hand out the id of an archived row again
+        {'sqlite_autoincrement': True},
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     type = db.Column(db.String(100), nullable=False)
-    date = db.Column(db.String(100), nullable=False)
-    delivery_date = db.Column(db.String(100), default='to be updated')
+    date = db.Column(db.Date, nullable=False)
+    delivery_date = db.Column(db.Date)
     source_city = db.Column(db.String(255), nullable=False)
     destination_city = db.Column(db.String(255), nullable=False)
-    internal_status = db.Column(db.String(100), default='requested')
-    delivery_status = db.Column(db.String(100), default='processing')
+    # Non-native enums are stored as short VARCHARs, so adding a status never needs a type migration
+    internal_status = db.Column(db.Enum(*INTERNAL_STATUSES, name='internal_status', native_enum=False,
+                                        validate_strings=True), default='requested', nullable=False)
+    delivery_status = db.Column(db.Enum(*DELIVERY_STATUSES, name='delivery_status', native_enum=False,
+                                        validate_strings=True), default='processing', nullable=False)
     description = db.Column(db.Text)
     amount = db.Column(db.Float, default=0.0)
+    # Bumped on every UPDATE; SQLAlchemy adds "WHERE version = ?" so concurrent writers can't lose updates
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Position in the change feed, drawn from ChangeCounter on every insert/update
+    revision = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime)
     
-    user = db.relationship('User', backref=db.backref('transactions', lazy=True))
\ No newline at end of file
+    user = db.relationship('User', backref=db.backref('transactions', lazy=True))
+
+    __mapper_args__ = {'version_id_col': version}
+
+class TransactionArchive(db.Model):
+    # Delivered and paid transactions moved out of the hot table by application.archive; ids are kept
+    __table_args__ = (
+        db.Index('ix_transaction_archive_user_id_id', 'user_id', 'id'),
+        db.Index('ix_transaction_archive_lane_date', 'source_city', 'destination_city', 'date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(255), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    type = db.Column(db.String(100), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    delivery_date = db.Column(db.Date)
+    source_city = db.Column(db.String(255), nullable=False)
+    destination_city = db.Column(db.String(255), nullable=False)
+    internal_status = db.Column(db.Enum(*INTERNAL_STATUSES, name='internal_status', native_enum=False,
+                                        validate_strings=True), nullable=False)
+    delivery_status = db.Column(db.Enum(*DELIVERY_STATUSES, name='delivery_status', native_enum=False,
+                                        validate_strings=True), nullable=False)
+    description = db.Column(db.Text)
+    amount = db.Column(db.Float, default=0.0)
+    version = db.Column(db.Integer, nullable=False)
+    revision = db.Column(db.BigInteger, nullable=False)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+class IdempotencyKey(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_idempotency_key_user_key'),
+        # The purge job deletes by age
+        db.Index('ix_idempotency_key_created_at', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(255), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    endpoint = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    # NULL until the original request finishes; retries meanwhile get 409
+    status_code = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+class ChangeCounter(db.Model):
+    # Single row holding the last revision handed out
+    id = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+class TransactionTombstone(db.Model):
+    __table_args__ = (
+        db.Index('ix_transaction_tombstone_revision', 'revision'),
+        db.Index('ix_transaction_tombstone_user_id_revision', 'user_id', 'revision'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    revision = db.Column(db.BigInteger, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+class Job(db.Model):
+    __table_args__ = (
+        # Workers poll for due jobs by status and run_at
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+        db.Index('ix_job_status_locked_until', 'status', 'locked_until'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    status = db.Column(db.Enum(*JOB_STATUSES, name='job_status', native_enum=False, validate_strings=True),
+                       default='queued', nullable=False)
+    # Incremented on every claim; doubles as the lease token for the worker holding the job
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    # A running job whose lease has expired is handed to another worker
+    locked_until = db.Column(db.DateTime)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+
+class LaneDailyRollup(db.Model):
+    # Per-lane, per-day aggregates of the transaction table, maintained by application.analytics
+    __table_args__ = (
+        db.UniqueConstraint('source_city', 'destination_city', 'day', name='uq_lane_daily_rollup_key'),
+        db.Index('ix_lane_daily_rollup_day', 'day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    source_city = db.Column(db.String(255), nullable=False)
+    destination_city = db.Column(db.String(255), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    shipments = db.Column(db.Integer, nullable=False, default=0)
+    amount_sum = db.Column(db.Float, nullable=False, default=0.0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    delivered = db.Column(db.Integer, nullable=False, default=0)
+    on_time = db.Column(db.Integer, nullable=False, default=0)
+    transit_days_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+class LaneRollupDirty(db.Model):
+    # (lane, day) keys written since the last refresh; filled by database triggers
+    id = db.Column(db.Integer, primary_key=True)
+    source_city = db.Column(db.String(255), nullable=False)
+    destination_city = db.Column(db.String(255), nullable=False)
+    day = db.Column(db.Date, nullable=False)
@@ -0,0 +1,143 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+from application.slots import FileSlots
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full or a hash took too long; callers should answer 503."""
+
+def method_prefix(method):
+    """The method string werkzeug stores in front of hashes made with `method`, without hashing anything.
+
+    Shorthands like "scrypt" are expanded to the parameters werkzeug fills in for them.
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        return f'scrypt:{2 ** 15}:8:1'
+    if name == 'pbkdf2' and len(args) < 2:
+        return f"pbkdf2:{args[0] if args else 'sha256'}:{DEFAULT_PBKDF2_ITERATIONS}"
+    return method
+
+class HostSlots:
+    """Hash slots shared by every worker process on the host, plus admission tickets.
+
+    A hash needs a ticket (slots + queue of them) before it may wait for a
+    slot, so a login storm is turned away at the door instead of parking
+    request threads in every worker.
+    """
+
+    def __init__(self, directory, slots, queue):
+        self.slots = FileSlots(directory, 'slot', slots)
+        self.tickets = FileSlots(directory, 'ticket', slots + queue)
+
+    def admit(self):
+        ticket = self.tickets.acquire()
+        if ticket is None:
+            raise HasherBusy('Password hashing queue is full on every worker')
+        return ticket
+
+    def run(self, ticket, deadline, func, *args):
+        try:
+            slot = self.slots.acquire()
+            while slot is None:
+                if time.monotonic() >= deadline:
+                    raise HasherBusy('Password hashing timed out')
+                time.sleep(0.005)
+                slot = self.slots.acquire()
+            try:
+                return func(*args)
+            finally:
+                FileSlots.release(slot)
+        finally:
+            FileSlots.release(ticket)
+
+class PasswordHasher:
+    """Runs password hashing on a small dedicated thread pool.
+
+    hashlib's scrypt/pbkdf2 release the GIL, so hashes run in parallel with
+    request threads while the pool size caps how many CPU-heavy hashes a
+    worker does at once. Requests beyond the pool plus PASSWORD_HASH_QUEUE
+    are rejected immediately instead of queueing behind a login burst. With
+    PASSWORD_HASH_LOCK_DIR set, the same cap also applies across all
+    workers on the host: PASSWORD_HASH_HOST_SLOTS hashes at once and
+    PASSWORD_HASH_HOST_QUEUE waiting.
+    """
+
+    def __init__(self):
+        self.method = 'scrypt'
+        self.workers = 2
+        self.timeout = 10
+        self.capacity = 18
+        self.in_flight = 0
+        self.rejected = 0
+        self.host_slots = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._method_prefix = method_prefix(self.method)
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 10)
+        self.capacity = self.workers + app.config.get('PASSWORD_HASH_QUEUE', 16)
+        lock_dir = app.config.get('PASSWORD_HASH_LOCK_DIR')
+        slots = app.config.get('PASSWORD_HASH_HOST_SLOTS', 0)
+        queue = app.config.get('PASSWORD_HASH_HOST_QUEUE', 0)
+        self.host_slots = HostSlots(lock_dir, slots, queue) if lock_dir and slots > 0 and FileSlots.available else None
+        self._method_prefix = method_prefix(self.method)
+
+    def _release(self, future=None):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _run(self, func, *args):
+        with self._lock:
+            # in_flight counts running and queued hashes
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                raise HasherBusy('Password hashing queue is full')
+            self.in_flight += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password-hash')
+        try:
+            if self.host_slots:
+                ticket = self.host_slots.admit()
+                try:
+                    # Stop waiting for a host slot once the caller has given up on the result
+                    future = self._executor.submit(self.host_slots.run, ticket, time.monotonic() + self.timeout,
+                                                   func, *args)
+                except Exception:
+                    FileSlots.release(ticket)
+                    raise
+            else:
+                future = self._executor.submit(func, *args)
+        except HasherBusy:
+            self._release()
+            self.rejected += 1
+            raise
+        except Exception:
+            self._release()
+            raise
+        # The slot is freed when the hash finishes, even if this request gave up waiting
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self.rejected += 1
+            raise HasherBusy('Password hashing timed out') from None
+        except HasherBusy:
+            self.rejected += 1
+            raise
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True when the stored hash was made with different method or cost parameters."""
+        return password_hash.split('$', 1)[0] != self._method_prefix
+
+password_hasher = PasswordHasher()
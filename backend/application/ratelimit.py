@@ -0,0 +1,229 @@
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from flask import g, jsonify, request, session
+from flask_security.utils import parse_auth_token
+from application.slots import FileSlots
+
+logger = logging.getLogger(__name__)
+
+# Endpoints that are never limited: health probes and the metrics scrape
+EXEMPT_ENDPOINTS = {'static', 'health_check', 'api_health', 'db_health', 'metrics'}
+AUTH_ENDPOINTS = {'login', 'register', 'logout'}
+# Endpoints whose responses stay open (a change stream, an export); they get their own in-flight cap
+STREAMING_ENDPOINTS = {'changesstreamapi', 'transactionexportapi'}
+WRITE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+LIMIT_CLASSES = ('read', 'write', 'auth')
+
+def _refill(tokens, elapsed, rate, burst):
+    """Token bucket step: returns (tokens left, seconds to wait); wait is 0 when the request may go ahead."""
+    tokens = min(burst, tokens + elapsed * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+class LocalBuckets:
+    """Token buckets kept in this process only."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._swept_at = time.monotonic()
+
+    def take(self, key, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens, wait = _refill(tokens, now - updated_at, rate, burst)
+            self._buckets[key] = (tokens, now)
+            if now - self._swept_at > 60:
+                self._sweep(now)
+        return wait
+
+    def _sweep(self, now):
+        # An idle bucket refills completely within an hour at any sane rate, so it is the same as a missing one
+        self._buckets = {key: value for key, value in self._buckets.items() if now - value[1] < 3600}
+        self._swept_at = now
+
+class SQLiteBuckets:
+    """Token buckets in a SQLite file, shared by every worker process on the host."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connect().execute('CREATE TABLE IF NOT EXISTS rate_buckets '
+                                '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            # Connections must not be shared across a fork
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, key, rate, burst):
+        conn = self._connect()
+        now = time.time()
+        # IMMEDIATE takes the write lock up front so two workers can't both spend the last token
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated_at FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated_at = row if row else (burst, now)
+            tokens, wait = _refill(tokens, max(0.0, now - updated_at), rate, burst)
+            conn.execute('INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            if row is None:
+                conn.execute('DELETE FROM rate_buckets WHERE updated_at < ?', (now - 3600,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+class InFlightCap:
+    """At most `limit` requests in progress: on the whole host when given FileSlots, in this worker otherwise."""
+
+    def __init__(self, limit, slots=None):
+        self.limit = limit
+        self.slots = slots
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Return a slot to hand back to release(), or None when the cap is reached."""
+        slot = True
+        if self.slots:
+            slot = self.slots.acquire()
+            if slot is None:
+                return None
+        with self._lock:
+            if not self.slots and self.in_flight >= self.limit:
+                return None
+            self.in_flight += 1
+        return slot
+
+    def release(self, slot):
+        if slot is not True:
+            FileSlots.release(slot)
+        with self._lock:
+            self.in_flight -= 1
+
+class RateLimiter:
+    """Per-client token buckets plus a cap on requests in flight.
+
+    Runs as the first before_request hook, so rejected requests cost no SQL.
+    Clients are identified by the user in their auth token (checked by
+    signature only) or session, falling back to the remote address. The
+    in-flight caps cover every worker on the host when MAX_CONCURRENT_LOCK_DIR
+    is set, and each worker on its own otherwise. Streaming endpoints are
+    capped by MAX_CONCURRENT_STREAMS instead of MAX_CONCURRENT_REQUESTS, so
+    idle followers can't hold every slot.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.limits = {}
+        self.buckets = None
+        self.requests = None
+        self.streams = None
+        self.limited = dict.fromkeys(LIMIT_CLASSES, 0)
+        self.shed = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('RATE_LIMIT_ENABLED', True)
+        self.limits = {}
+        for name in LIMIT_CLASSES:
+            per_minute = app.config.get(f'RATE_LIMIT_{name.upper()}_PER_MINUTE', 0)
+            if per_minute > 0:
+                burst = app.config.get(f'RATE_LIMIT_{name.upper()}_BURST') or per_minute
+                self.limits[name] = (per_minute / 60.0, burst)
+        path = app.config.get('RATE_LIMIT_SQLITE_PATH')
+        self.buckets = SQLiteBuckets(path) if path else LocalBuckets()
+        lock_dir = app.config.get('MAX_CONCURRENT_LOCK_DIR')
+        self.requests = self._cap(lock_dir, 'request', app.config.get('MAX_CONCURRENT_REQUESTS', 0))
+        self.streams = self._cap(lock_dir, 'stream', app.config.get('MAX_CONCURRENT_STREAMS', 0))
+        if self.enabled:
+            app.before_request(self.before_request)
+            app.teardown_request(self.teardown_request)
+
+    @staticmethod
+    def _cap(lock_dir, name, limit):
+        if not limit:
+            return None
+        return InFlightCap(limit, FileSlots(lock_dir, name, limit) if lock_dir and FileSlots.available else None)
+
+    @property
+    def in_flight(self):
+        return self.requests.in_flight if self.requests else 0
+
+    @property
+    def streams_in_flight(self):
+        return self.streams.in_flight if self.streams else 0
+
+    def limit_class(self):
+        if request.method == 'OPTIONS' or request.endpoint in EXEMPT_ENDPOINTS:
+            return None
+        if request.endpoint in AUTH_ENDPOINTS:
+            return 'auth'
+        return 'write' if request.method in WRITE_METHODS else 'read'
+
+    def client_key(self, limit_class):
+        if limit_class != 'auth':
+            token = request.headers.get('Authentication-Token') or request.args.get('auth_token')
+            if token:
+                try:
+                    return 'user:' + parse_auth_token(token)['uid']
+                except Exception:
+                    pass
+            elif session.get('_user_id'):
+                return 'user:' + session['_user_id']
+        # Logins and anonymous callers are limited per address
+        return 'ip:' + (request.remote_addr or 'unknown')
+
+    def _reject(self, status, message, retry_after):
+        response = jsonify({'error': message})
+        response.status_code = status
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def before_request(self):
+        limit_class = self.limit_class()
+        if limit_class is None:
+            return None
+        if limit_class in self.limits:
+            rate, burst = self.limits[limit_class]
+            try:
+                wait = self.buckets.take(f'{limit_class}:{self.client_key(limit_class)}', rate, burst)
+            except Exception:
+                # A broken shared store shouldn't take the API down with it
+                logger.exception('Rate limit store failed; letting the request through')
+                wait = 0
+            if wait:
+                with self._lock:
+                    self.limited[limit_class] += 1
+                return self._reject(429, 'Rate limit exceeded, please slow down', wait)
+        cap = self.streams if request.endpoint in STREAMING_ENDPOINTS else self.requests
+        if cap is not None:
+            slot = cap.acquire()
+            if slot is None:
+                with self._lock:
+                    self.shed += 1
+                return self._reject(503, 'Server is busy, please retry shortly', 1)
+            g.rate_limit_slot = (cap, slot)
+        return None
+
+    def teardown_request(self, exc=None):
+        held = g.pop('rate_limit_slot', None)
+        if held is not None:
+            cap, slot = held
+            cap.release(slot)
+
+rate_limiter = RateLimiter()
@@ -1,44 +1,204 @@
 from flask_restful import Api, Resource, reqparse
 from flask_security import auth_required, current_user
-from application.models import Transaction, User
+from application.models import Job, Transaction, TransactionArchive, User, DELIVERY_STATUSES, INTERNAL_STATUSES
 from application.database import db
-from flask import jsonify, request
+from application.stats import get_stats
+from application.idempotency import idempotent
+from application.changes import allocate_revisions, changes_since, current_revision
+from application.response_cache import args_fingerprint, conditional_json
+from application.serializers import (ALL_FIELDS, dumps, format_date, parse_fields, serialize_rows,
+                                     transaction_select)
+from application.search import ranked_matches, search_terms
+from application.jobs import JobFailed, enqueue, job_handler, serialize_job
+from application.analytics import has_pending_refresh, lane_series, lane_summary, schedule_refresh
+from flask import jsonify, request, current_app, make_response, Response, stream_with_context
+from sqlalchemy import case, insert, select, union_all, update
+from sqlalchemy.orm.exc import StaleDataError
+import csv
 import datetime
+import io
+import json
+import time
 
 api = Api()
 
+@api.representation('application/json')
+def output_json(data, code, headers=None):
+    # Same as Flask-RESTful's default, but through the app's (orjson-backed when available) JSON provider
+    response = make_response(current_app.json.dumps(data) + '\n', code)
+    response.headers.extend(headers or {})
+    return response
+
+def is_admin():
+    return current_user.has_role('admin')
+
+def parse_date(value, field):
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        # Accept plain dates as well as full ISO timestamps from date pickers
+        return datetime.date.fromisoformat(str(value)[:10])
+    except ValueError:
+        raise ValueError(f'Invalid {field}: expected YYYY-MM-DD') from None
+
+CONFLICT_ERROR = {'error': 'Transaction was modified by another request; reload and retry'}
+
+def etag_for(transaction):
+    return f'"{transaction.version}"'
+
+def check_precondition(transaction, expected_version=None):
+    # If-Match (or a "version" field in the body) turns the write into a compare-and-set
+    if_match = request.headers.get('If-Match')
+    if if_match:
+        tags = [tag.strip().removeprefix('W/').strip('"') for tag in if_match.split(',')]
+        if '*' in tags or str(transaction.version) in tags:
+            return None
+    elif expected_version is None or str(expected_version) == str(transaction.version):
+        return None
+    return CONFLICT_ERROR, 412, {'ETag': etag_for(transaction)}
+
+def validate_status(value, allowed, field):
+    if value not in allowed:
+        raise ValueError(f"Invalid {field}: must be one of {', '.join(allowed)}")
+    return value
+
+def transaction_values(data, user_id):
+    # Extract required fields
+    amount = data.get('amount')
+    delivery_date = data.get('delivery_date')
+
+    if not amount or not delivery_date:
+        raise ValueError('Amount and delivery date are required')
+
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid amount: expected a number') from None
+
+    return {
+        'name': data.get('name') or 'Shipment',
+        'user_id': user_id,
+        'type': data.get('type') or 'delivery',
+        # Use current date if not provided
+        'date': parse_date(data['date'], 'date') if data.get('date') else datetime.date.today(),
+        'delivery_date': parse_date(delivery_date, 'delivery_date'),
+        'source_city': data.get('source_city') or 'Origin',
+        'destination_city': data.get('destination_city') or 'Destination',
+        'description': data.get('description') or '',
+        'amount': amount,
+        'delivery_status': validate_status(data.get('status') or 'pending', DELIVERY_STATUSES, 'status'),
+        'internal_status': 'requested'
+    }
+
+def filtered_transactions(args, fields=ALL_FIELDS, model=Transaction):
+    # Non-admins only ever see their own shipments; admins may narrow by user_id
+    query = transaction_select(fields, model)
+    if is_admin():
+        user_id = args.get('user_id', type=int)
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+    else:
+        query = query.filter(model.user_id == current_user.id)
+
+    if args.get('delivery_status'):
+        delivery_status = validate_status(args['delivery_status'], DELIVERY_STATUSES, 'delivery_status')
+        query = query.filter(model.delivery_status == delivery_status)
+    if args.get('internal_status'):
+        internal_status = validate_status(args['internal_status'], INTERNAL_STATUSES, 'internal_status')
+        query = query.filter(model.internal_status == internal_status)
+    if args.get('source_city'):
+        query = query.filter(model.source_city == args['source_city'])
+    if args.get('destination_city'):
+        query = query.filter(model.destination_city == args['destination_city'])
+    if args.get('city'):
+        query = query.filter(db.or_(model.source_city == args['city'],
+                                    model.destination_city == args['city']))
+    if args.get('date_from'):
+        query = query.filter(model.date >= parse_date(args['date_from'], 'date_from'))
+    if args.get('date_to'):
+        query = query.filter(model.date <= parse_date(args['date_to'], 'date_to'))
+    return query
+
+def include_archived(args, default=False):
+    value = args.get('include_archived')
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes')
+
+def transaction_queries(args, fields=ALL_FIELDS):
+    # History is opt-in, so default reads never touch the archive table
+    queries = [filtered_transactions(args, fields)]
+    if include_archived(args):
+        queries.append(filtered_transactions(args, fields, TransactionArchive))
+    return queries
+
+def ordered_by_id(queries):
+    if len(queries) == 1:
+        return queries[0].order_by(queries[0].selected_columns.id)
+    combined = union_all(*queries).subquery()
+    return select(combined).order_by(combined.c.id)
+
+def page_limit(args):
+    default_limit = current_app.config.get('TRANSACTIONS_PAGE_SIZE', 50)
+    max_limit = current_app.config.get('TRANSACTIONS_MAX_PAGE_SIZE', 500)
+    limit = args.get('limit', default=default_limit, type=int)
+    return max(1, min(limit, max_limit))
+
+def paginate_transactions(queries, args):
+    # Keyset pagination on id: each page is an index range scan, independent of offset
+    limit = page_limit(args)
+    cursor = args.get('cursor', type=int)
+    descending = args.get('order') == 'desc'
+
+    pages = []
+    for query in queries:
+        id_column = query.selected_columns.id
+        if cursor is not None:
+            query = query.filter(id_column < cursor if descending else id_column > cursor)
+        pages.append(query.order_by(id_column.desc() if descending else id_column).limit(limit + 1))
+    if len(pages) == 1:
+        statement = pages[0]
+    else:
+        # Each table contributes at most one page; merge them and cut back to size
+        combined = union_all(*[page.subquery().select() for page in pages]).subquery()
+        statement = select(combined).order_by(combined.c.id.desc() if descending else combined.c.id).limit(limit + 1)
+    rows = db.session.execute(statement).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = rows[-1].id if has_more else None
+    return rows, next_cursor, limit
+
 class TransactionListAPI(Resource):
     @auth_required('token')
     def get(self):
+        # Any write bumps the change-feed revision, so (caller, params, revision)
+        # identifies the response without loading a single row
+        scope = 'admin' if is_admin() else current_user.id
+        tag = f'list-{scope}-{current_revision()}-{args_fingerprint()}'
+        # An unpaginated list is the whole table; it still gets a 304 but is not worth holding in memory
+        paginated = 'limit' in request.args or 'cursor' in request.args
+        return conditional_json(tag, tag if paginated else None, self.build_list)
+
+    def build_list(self):
         try:
-            transactions = Transaction.query.all()
-            result = []
-            for transaction in transactions:
-                user = User.query.get(transaction.user_id)
-                result.append({
-                    'id': transaction.id,
-                    'name': transaction.name,
-                    'user_id': transaction.user_id,
-                    'user': {'username': user.username, 'email': user.email} if user else None,
-                    'type': transaction.type,
-                    'date': transaction.date,
-                    'delivery_date': transaction.delivery_date,
-                    'source_city': transaction.source_city,
-                    'destination_city': transaction.destination_city,
-                    'internal_status': transaction.internal_status,
-                    'delivery_status': transaction.delivery_status,
-                    'description': transaction.description,
-                    'amount': transaction.amount,
-                    'status': transaction.delivery_status,  # Map to frontend expected field
-                    'payment_status': 'paid' if transaction.internal_status == 'paid' else 'pending',
-                    'created_at': transaction.date,  # Using date as created_at
-                    'updated_at': transaction.date   # Using date as updated_at
-                })
+            fields = parse_fields(request.args.get('fields'))
+            queries = transaction_queries(request.args, fields)
+            paginated = 'limit' in request.args or 'cursor' in request.args
+            if paginated:
+                rows, next_cursor, limit = paginate_transactions(queries, request.args)
+            else:
+                rows = db.session.execute(ordered_by_id(queries)).all()
+            result = serialize_rows(rows, fields)
+            if paginated:
+                return {'items': result, 'next_cursor': next_cursor, 'limit': limit}
             return result
+        except ValueError as e:
+            return {'error': str(e)}, 400
         except Exception as e:
             return {'error': str(e)}, 500
 
     @auth_required('token')
+    @idempotent('create')
     def post(self):
         try:
             # Get JSON data from request
@@ -46,34 +206,15 @@ class TransactionListAPI(Resource):
             if not data:
                 return {'error': 'No data provided'}, 400
 
-            # Extract required fields
-            amount = data.get('amount')
-            delivery_date = data.get('delivery_date')
-            
-            if not amount or not delivery_date:
-                return {'error': 'Amount and delivery date are required'}, 400
-
-            # Use current date if not provided
-            transaction_date = data.get('date') or datetime.datetime.now().strftime('%Y-%m-%d')
-
-            transaction = Transaction(
-                name=data.get('name', 'Shipment'),
-                user_id=current_user.id,
-                type=data.get('type', 'delivery'),
-                date=transaction_date,
-                delivery_date=delivery_date,
-                source_city=data.get('source_city', 'Origin'),
-                destination_city=data.get('destination_city', 'Destination'),
-                description=data.get('description', ''),
-                amount=float(amount),
-                delivery_status=data.get('status', 'pending'),
-                internal_status='requested'
-            )
+            transaction = Transaction(**transaction_values(data, current_user.id))
             
             db.session.add(transaction)
             db.session.commit()
             
             return {'message': 'Transaction created successfully', 'id': transaction.id}, 201
+        except ValueError as e:
+            db.session.rollback()
+            return {'error': str(e)}, 400
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 500
@@ -83,31 +224,95 @@ class TransactionListAPI(Resource):
 
 api.add_resource(TransactionListAPI, '/api/get', '/api/create')
 
+def probe_transaction(transaction_id):
+    """Return (model, version row) for the table holding `transaction_id`, hot table first."""
+    for model in (Transaction, TransactionArchive):
+        # Column-only probe: enough to answer 304 without hydrating the row
+        row = db.session.execute(
+            select(model.version, model.updated_at).where(model.id == transaction_id)
+        ).first()
+        if row is not None:
+            return model, row
+    return None, None
+
+def parse_text(value, field):
+    if not isinstance(value, str):
+        raise ValueError(f'Invalid {field}: expected a string')
+    return value
+
+def parse_amount(value, field):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid {field}: expected a number') from None
+
+# Columns PUT /api/update may set, with the parser for each; `status` is the payload's name for delivery_status
+EDITABLE_COLUMNS = {
+    'name': parse_text,
+    'type': parse_text,
+    'date': parse_date,
+    'delivery_date': parse_date,
+    'source_city': parse_text,
+    'destination_city': parse_text,
+    'description': parse_text,
+    'amount': parse_amount,
+    'delivery_status': lambda value, field: validate_status(value, DELIVERY_STATUSES, field),
+}
+# Payload fields a client may send back unchanged after reading a transaction; they are never written
+READ_ONLY_FIELDS = {'id', 'version', 'revision', 'user', 'payment_status', 'created_at', 'updated_at'}
+
+def unknown_user_ids(user_ids):
+    known = db.session.execute(select(User.id).where(User.id.in_(user_ids))).scalars().all()
+    return set(user_ids) - set(known)
+
+def transaction_changes(transaction, data):
+    """Validate a PUT body against EDITABLE_COLUMNS and return {column: value} to set."""
+    changes = {}
+    for key, value in data.items():
+        column = 'delivery_status' if key == 'status' else key
+        if value is None or key in READ_ONLY_FIELDS:
+            continue
+        if column in EDITABLE_COLUMNS:
+            changes[column] = EDITABLE_COLUMNS[column](value, key)
+        elif column == 'user_id':
+            # Non-admins are turned away before this; admins may hand a shipment to another user
+            try:
+                user_id = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f'Invalid {key}: expected an integer') from None
+            if user_id != transaction.user_id:
+                if unknown_user_ids({user_id}):
+                    raise ValueError(f'Unknown user_id: {user_id}')
+                changes['user_id'] = user_id
+        elif column == 'internal_status':
+            if value != transaction.internal_status:
+                raise ValueError('internal_status changes through /api/pay and /api/update_amount')
+        else:
+            raise ValueError(f'Unknown field: {key}')
+    return changes
+
 class TransactionAPI(Resource):
     @auth_required('token')
     def get(self, transaction_id):
         try:
-            transaction = Transaction.query.get_or_404(transaction_id)
-            user = User.query.get(transaction.user_id)
-            return {
-                'id': transaction.id,
-                'name': transaction.name,
-                'user_id': transaction.user_id,
-                'user': {'username': user.username, 'email': user.email} if user else None,
-                'type': transaction.type,
-                'date': transaction.date,
-                'delivery_date': transaction.delivery_date,
-                'source_city': transaction.source_city,
-                'destination_city': transaction.destination_city,
-                'internal_status': transaction.internal_status,
-                'delivery_status': transaction.delivery_status,
-                'description': transaction.description,
-                'amount': transaction.amount,
-                'status': transaction.delivery_status,
-                'payment_status': 'paid' if transaction.internal_status == 'paid' else 'pending',
-                'created_at': transaction.date,
-                'updated_at': transaction.date
-            }
+            model, row = probe_transaction(transaction_id)
+            if row is None:
+                return {'error': 'Transaction not found'}, 404
+        except Exception as e:
+            return {'error': str(e)}, 500
+        # Archiving copies the row as is, so the version still identifies its content
+        return conditional_json(str(row.version), f'detail-{transaction_id}-{row.version}-{args_fingerprint()}',
+                                lambda: self.build_detail(transaction_id, model), last_modified=row.updated_at)
+
+    def build_detail(self, transaction_id, model=Transaction):
+        try:
+            fields = parse_fields(request.args.get('fields'))
+            row = db.session.execute(transaction_select(fields, model).where(model.id == transaction_id)).first()
+            if row is None:
+                return {'error': 'Transaction not found'}, 404
+            return serialize_rows([row], fields)[0]
+        except ValueError as e:
+            return {'error': str(e)}, 400
         except Exception as e:
             return {'error': str(e)}, 500
 
@@ -120,16 +325,23 @@ class TransactionAPI(Resource):
             if not data:
                 return {'error': 'No data provided'}, 400
 
-            # Update fields if provided
-            for key, value in data.items():
-                if value is not None:
-                    if key == 'status':
-                        setattr(transaction, 'delivery_status', value)
-                    elif hasattr(transaction, key):
-                        setattr(transaction, key, value)
+            failed = check_precondition(transaction, data.get('version'))
+            if failed:
+                return failed
+
+            if not is_admin() and data.get('user_id') not in (None, transaction.user_id):
+                return {'error': 'Only admins can reassign a transaction'}, 403
+            for column, value in transaction_changes(transaction, data).items():
+                setattr(transaction, column, value)
             
             db.session.commit()
             return {'message': 'Transaction updated successfully'}
+        except ValueError as e:
+            db.session.rollback()
+            return {'error': str(e)}, 400
+        except StaleDataError:
+            db.session.rollback()
+            return CONFLICT_ERROR, 409
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 500
@@ -138,9 +350,15 @@ class TransactionAPI(Resource):
     def delete(self, transaction_id):
         try:
             transaction = Transaction.query.get_or_404(transaction_id)
+            failed = check_precondition(transaction)
+            if failed:
+                return failed
             db.session.delete(transaction)
             db.session.commit()
             return {'message': 'Transaction deleted successfully'}
+        except StaleDataError:
+            db.session.rollback()
+            return CONFLICT_ERROR, 409
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 500
@@ -150,18 +368,63 @@ class TransactionAPI(Resource):
 
 api.add_resource(TransactionAPI, '/api/update/<int:transaction_id>', '/api/delete/<int:transaction_id>', '/api/review_transaction/<int:transaction_id>')
 
+def wants_async():
+    # RFC 7240: clients opt in to 202 + job polling with `Prefer: respond-async`
+    return 'respond-async' in request.headers.get('Prefer', '')
+
+def accepted(job):
+    return {'job_id': job.id, 'status': job.status}, 202, {'Location': f'/api/jobs/{job.id}'}
+
+def job_transaction(payload):
+    transaction = db.session.get(Transaction, payload['transaction_id'])
+    if transaction is None:
+        raise JobFailed(f"Transaction {payload['transaction_id']} no longer exists")
+    return transaction
+
+def apply_payment(transaction):
+    # Paying twice is a no-op rather than a second write
+    if transaction.internal_status == 'paid':
+        return {'message': 'Payment already processed'}
+    transaction.internal_status = 'paid'
+    return {'message': 'Payment processed successfully'}
+
+def apply_amount(transaction, amount):
+    transaction.amount = amount
+    transaction.internal_status = 'Payment Pending'
+    return {'message': 'Amount updated successfully'}
+
+@job_handler('pay')
+def pay_job(payload):
+    return apply_payment(job_transaction(payload))
+
+@job_handler('update_amount')
+def update_amount_job(payload):
+    return apply_amount(job_transaction(payload), payload['amount'])
+
 class PaymentAPI(Resource):
     @auth_required('token')
+    @idempotent('pay')
     def get(self, transaction_id):
         try:
             transaction = Transaction.query.get_or_404(transaction_id)
-            transaction.internal_status = 'paid'
+            failed = check_precondition(transaction)
+            if failed:
+                return failed
+            if wants_async():
+                return accepted(enqueue('pay', {'transaction_id': transaction_id}, current_user.id))
+            result = apply_payment(transaction)
             db.session.commit()
-            return {'message': 'Payment processed successfully'}
+            return result
+        except StaleDataError:
+            db.session.rollback()
+            return CONFLICT_ERROR, 409
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 500
 
+    # POST is the preferred verb; GET stays for existing clients
+    post = get
+
     def options(self, transaction_id=None):
         return {'status': 'ok'}, 200
 
@@ -176,11 +439,20 @@ class UpdateAmountAPI(Resource):
             
             if not data or 'amount' not in data:
                 return {'error': 'Amount is required'}, 400
+            failed = check_precondition(transaction, data.get('version'))
+            if failed:
+                return failed
             
-            transaction.amount = float(data['amount'])
-            transaction.internal_status = 'Payment Pending'
+            amount = float(data['amount'])
+            if wants_async():
+                return accepted(enqueue('update_amount', {'transaction_id': transaction_id, 'amount': amount},
+                                        current_user.id))
+            result = apply_amount(transaction, amount)
             db.session.commit()
-            return {'message': 'Amount updated successfully'}
+            return result
+        except StaleDataError:
+            db.session.rollback()
+            return CONFLICT_ERROR, 409
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 500
@@ -199,10 +471,19 @@ class UpdateDeliveryStatusAPI(Resource):
             
             if not data or 'delivery_status' not in data:
                 return {'error': 'Delivery status is required'}, 400
+            failed = check_precondition(transaction, data.get('version'))
+            if failed:
+                return failed
             
-            transaction.delivery_status = data['delivery_status']
+            transaction.delivery_status = validate_status(data['delivery_status'], DELIVERY_STATUSES, 'delivery_status')
             db.session.commit()
             return {'message': 'Delivery status updated successfully'}
+        except ValueError as e:
+            db.session.rollback()
+            return {'error': str(e)}, 400
+        except StaleDataError:
+            db.session.rollback()
+            return CONFLICT_ERROR, 409
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 500
@@ -221,10 +502,19 @@ class UpdateDeliveryDateAPI(Resource):
             
             if not data or 'delivery_date' not in data:
                 return {'error': 'Delivery date is required'}, 400
+            failed = check_precondition(transaction, data.get('version'))
+            if failed:
+                return failed
             
-            transaction.delivery_date = data['delivery_date']
+            transaction.delivery_date = parse_date(data['delivery_date'], 'delivery_date')
             db.session.commit()
             return {'message': 'Delivery date updated successfully'}
+        except ValueError as e:
+            db.session.rollback()
+            return {'error': str(e)}, 400
+        except StaleDataError:
+            db.session.rollback()
+            return CONFLICT_ERROR, 409
         except Exception as e:
             db.session.rollback()
             return {'error': str(e)}, 500
@@ -232,4 +522,457 @@ class UpdateDeliveryDateAPI(Resource):
     def options(self, transaction_id=None):
         return {'status': 'ok'}, 200
 
-api.add_resource(UpdateDeliveryDateAPI, '/api/update_delivery_date/<int:transaction_id>')
\ No newline at end of file
+api.add_resource(UpdateDeliveryDateAPI, '/api/update_delivery_date/<int:transaction_id>')
+
+class StatsAPI(Resource):
+    @auth_required('token')
+    def get(self):
+        try:
+            if is_admin():
+                user_id = request.args.get('user_id', type=int)
+            else:
+                user_id = current_user.id
+            # Totals and revenue must not shrink when old shipments are archived
+            archived = include_archived(request.args, default=True)
+            revision = current_revision()
+            tag = f'stats-{user_id}-{archived}-{revision}'
+        except Exception as e:
+            return {'error': str(e)}, 500
+        return conditional_json(tag, tag, lambda: self.build_stats(user_id, archived, revision))
+
+    def build_stats(self, user_id, archived=True, revision=None):
+        try:
+            return get_stats(user_id, archived, revision)
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+    def options(self):
+        return {'status': 'ok'}, 200
+
+api.add_resource(StatsAPI, '/api/stats')
+
+class SearchAPI(Resource):
+    @auth_required('token')
+    def get(self):
+        scope = 'admin' if is_admin() else current_user.id
+        tag = f'search-{scope}-{current_revision()}-{args_fingerprint()}'
+        return conditional_json(tag, tag, self.build_results)
+
+    def build_results(self):
+        try:
+            terms = search_terms(request.args.get('q'))
+            if not terms:
+                return {'error': 'q is required'}, 400
+            limit = page_limit(request.args)
+            # Ranked results have no stable key to seek on, so the cursor is an offset
+            offset = max(0, request.args.get('cursor', default=0, type=int))
+            fields = parse_fields(request.args.get('fields'))
+            matches = ranked_matches(terms)
+            rows = db.session.execute(
+                filtered_transactions(request.args, fields)
+                .join(matches, matches.c.id == Transaction.id)
+                .order_by(matches.c.rank, Transaction.id.desc())
+                .offset(offset).limit(limit + 1)
+            ).all()
+            has_more = len(rows) > limit
+            return {
+                'items': serialize_rows(rows[:limit], fields),
+                'next_cursor': offset + limit if has_more else None,
+                'limit': limit
+            }
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+    def options(self):
+        return {'status': 'ok'}, 200
+
+api.add_resource(SearchAPI, '/api/search')
+
+def bulk_body_stream():
+    # An Idempotency-Key makes the body get hashed, and so read and buffered, before the handler
+    # runs; request.stream is empty by then, so read the buffered copy instead
+    if request.headers.get('Idempotency-Key'):
+        return io.BytesIO(request.get_data())
+    return request.stream
+
+def iter_bulk_rows():
+    # JSON arrays are parsed whole; NDJSON and CSV bodies are read line by line from the stream
+    content_type = request.mimetype or ''
+    if 'ndjson' in content_type or 'jsonlines' in content_type:
+        for line in io.TextIOWrapper(bulk_body_stream(), encoding='utf-8'):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield ValueError(f'Invalid JSON line: {e}')
+    elif 'csv' in content_type:
+        yield from csv.DictReader(io.TextIOWrapper(bulk_body_stream(), encoding='utf-8', newline=''))
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            raise ValueError('Expected a JSON array, NDJSON or CSV body')
+        yield from data
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def parse_bulk_changes(data, field):
+    # Accept either {"<id>": value} or [{"id": <id>, "<field>": value}]
+    if isinstance(data, dict):
+        items = data.items()
+    elif isinstance(data, list):
+        items = [(item.get('id'), item.get(field)) for item in data if isinstance(item, dict)]
+    else:
+        raise ValueError(f'Expected an object of id -> {field} or a list of {{id, {field}}}')
+    changes = {}
+    for transaction_id, value in items:
+        try:
+            changes[int(transaction_id)] = value
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid transaction id: {transaction_id}') from None
+    return changes
+
+def bulk_update_column(column, changes):
+    # One UPDATE ... SET col = CASE id WHEN ... END WHERE id IN (...) per chunk
+    chunk_size = current_app.config.get('BULK_CHUNK_SIZE', 1000)
+    updated = []
+    for chunk in chunked(list(changes.items()), chunk_size):
+        mapping = dict(chunk)
+        ids = list(mapping)
+        existing = db.session.execute(select(Transaction.id).where(Transaction.id.in_(ids))).scalars().all()
+        if existing:
+            # Bulk statements skip the flush, so stamp change-feed revisions here
+            first = allocate_revisions(db.session, len(existing))
+            revisions = {transaction_id: first + i for i, transaction_id in enumerate(existing)}
+            db.session.execute(
+                update(Transaction)
+                .where(Transaction.id.in_(existing))
+                .values({column: case({i: mapping[i] for i in existing}, value=Transaction.id),
+                         'version': Transaction.version + 1,
+                         'revision': case(revisions, value=Transaction.id),
+                         'updated_at': datetime.datetime.utcnow()})
+                .execution_options(synchronize_session=False)
+            )
+        updated.extend(existing)
+    db.session.commit()
+    missing = sorted(set(changes) - set(updated))
+    return sorted(updated), missing
+
+class BulkTransactionAPI(Resource):
+    @auth_required('token')
+    @idempotent('bulk_create')
+    def post(self):
+        chunk_size = current_app.config.get('BULK_CHUNK_SIZE', 1000)
+        admin = is_admin()
+        results = []
+        created = 0
+        try:
+            rows = iter_bulk_rows()
+            for offset, chunk in enumerate(chunked(rows, chunk_size)):
+                values = []
+                positions = []
+                for index, data in enumerate(chunk):
+                    row_number = offset * chunk_size + index
+                    try:
+                        if isinstance(data, Exception):
+                            raise data
+                        if not isinstance(data, dict):
+                            raise ValueError('Row must be an object')
+                        # Admins importing carrier manifests may assign rows to other users
+                        user_id = int(data['user_id']) if admin and data.get('user_id') else current_user.id
+                        values.append(transaction_values(data, user_id))
+                        positions.append(row_number)
+                    except (TypeError, ValueError) as e:
+                        results.append({'row': row_number, 'error': str(e)})
+                if admin and values:
+                    # One bad owner would otherwise fail the whole chunk on its foreign key
+                    unknown = unknown_user_ids({row['user_id'] for row in values})
+                    if unknown:
+                        results.extend({'row': row_number, 'error': f"Unknown user_id: {row['user_id']}"}
+                                       for row_number, row in zip(positions, values) if row['user_id'] in unknown)
+                        kept = [(row_number, row) for row_number, row in zip(positions, values)
+                                if row['user_id'] not in unknown]
+                        positions = [row_number for row_number, _ in kept]
+                        values = [row for _, row in kept]
+                if not values:
+                    continue
+                try:
+                    # Bulk inserts skip the flush, so stamp change-feed revisions here
+                    first = allocate_revisions(db.session, len(values))
+                    now = datetime.datetime.utcnow()
+                    for i, row in enumerate(values):
+                        row['revision'] = first + i
+                        row['updated_at'] = now
+                    ids = db.session.execute(
+                        insert(Transaction).returning(Transaction.id, sort_by_parameter_order=True),
+                        values
+                    ).scalars().all()
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    # The driver's message carries SQL and other rows' values; keep it in the log
+                    current_app.logger.exception('Bulk import chunk failed')
+                    results.extend({'row': row_number, 'error': 'Could not save this chunk of rows'}
+                                   for row_number in positions)
+                    continue
+                created += len(ids)
+                results.extend({'row': row_number, 'id': transaction_id}
+                               for row_number, transaction_id in zip(positions, ids))
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        except Exception as e:
+            db.session.rollback()
+            return {'error': str(e)}, 500
+
+        results.sort(key=lambda result: result['row'])
+        failed = len(results) - created
+        return {'created': created, 'failed': failed, 'results': results}, 201 if created and not failed else 200
+
+    def options(self):
+        return {'status': 'ok'}, 200
+
+api.add_resource(BulkTransactionAPI, '/api/bulk/create')
+
+class BulkUpdateDeliveryStatusAPI(Resource):
+    @auth_required('token')
+    def put(self):
+        if not is_admin():
+            return {'error': 'Admin access required'}, 403
+        try:
+            changes = parse_bulk_changes(request.get_json(silent=True), 'delivery_status')
+            if not changes:
+                return {'error': 'Delivery status changes are required'}, 400
+            for value in changes.values():
+                validate_status(value, DELIVERY_STATUSES, 'delivery_status')
+
+            updated, missing = bulk_update_column('delivery_status', changes)
+            return {'updated': updated, 'not_found': missing}
+        except ValueError as e:
+            db.session.rollback()
+            return {'error': str(e)}, 400
+        except Exception as e:
+            db.session.rollback()
+            return {'error': str(e)}, 500
+
+    def options(self):
+        return {'status': 'ok'}, 200
+
+api.add_resource(BulkUpdateDeliveryStatusAPI, '/api/bulk/update_delivery_status')
+
+class BulkUpdateDeliveryDateAPI(Resource):
+    @auth_required('token')
+    def put(self):
+        if not is_admin():
+            return {'error': 'Admin access required'}, 403
+        try:
+            changes = parse_bulk_changes(request.get_json(silent=True), 'delivery_date')
+            if not changes:
+                return {'error': 'Delivery date changes are required'}, 400
+            changes = {i: parse_date(value, 'delivery_date') for i, value in changes.items()}
+
+            updated, missing = bulk_update_column('delivery_date', changes)
+            return {'updated': updated, 'not_found': missing}
+        except ValueError as e:
+            db.session.rollback()
+            return {'error': str(e)}, 400
+        except Exception as e:
+            db.session.rollback()
+            return {'error': str(e)}, 500
+
+    def options(self):
+        return {'status': 'ok'}, 200
+
+api.add_resource(BulkUpdateDeliveryDateAPI, '/api/bulk/update_delivery_date')
+
+EXPORT_COLUMNS = ['id', 'name', 'user_id', 'username', 'email', 'type', 'date', 'delivery_date',
+                  'source_city', 'destination_city', 'internal_status', 'delivery_status',
+                  'description', 'amount', 'payment_status']
+# username/email come from the nested user field
+EXPORT_FIELDS = tuple(column for column in EXPORT_COLUMNS if column not in ('username', 'email')) + ('user',)
+
+class TransactionExportAPI(Resource):
+    @auth_required('token')
+    def get(self):
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in ('ndjson', 'csv'):
+            return {'error': 'Invalid format: must be ndjson or csv'}, 400
+        try:
+            # CSV has a fixed header, so ?fields= only narrows NDJSON exports
+            fields = EXPORT_FIELDS if export_format == 'csv' else parse_fields(request.args.get('fields'))
+            query = ordered_by_id(transaction_queries(request.args, fields))
+        except ValueError as e:
+            return {'error': str(e)}, 400
+
+        # yield_per streams from a server-side cursor one batch at a time, so
+        # memory stays flat however many rows are exported
+        batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+        batches = db.session.execute(query.execution_options(yield_per=batch_size)).partitions()
+
+        def generate_ndjson():
+            for batch in batches:
+                yield '\n'.join(dumps(item) for item in serialize_rows(batch, fields)) + '\n'
+
+        def generate_csv():
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow(EXPORT_COLUMNS)
+            for batch in batches:
+                for data in serialize_rows(batch, fields):
+                    user = data.pop('user') or {}
+                    data['username'] = user.get('username')
+                    data['email'] = user.get('email')
+                    writer.writerow([data[column] for column in EXPORT_COLUMNS])
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+            # Header only when nothing matched
+            yield output.getvalue()
+
+        if export_format == 'csv':
+            response = Response(stream_with_context(generate_csv()), mimetype='text/csv')
+        else:
+            response = Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+        response.headers['Content-Disposition'] = f'attachment; filename=transactions.{export_format}'
+        return response
+
+    def options(self):
+        return {'status': 'ok'}, 200
+
+api.add_resource(TransactionExportAPI, '/api/export')
+
+def changes_scope():
+    if is_admin():
+        return request.args.get('user_id', type=int)
+    return current_user.id
+
+class ChangesAPI(Resource):
+    @auth_required('token')
+    def get(self):
+        try:
+            # since=latest just returns the head cursor, to start following from now
+            if request.args.get('since') == 'latest':
+                return {'changes': [], 'cursor': current_revision(), 'has_more': False}
+            since = request.args.get('since', default=0, type=int)
+            max_limit = current_app.config.get('TRANSACTIONS_MAX_PAGE_SIZE', 500)
+            limit = max(1, min(request.args.get('limit', default=max_limit, type=int), max_limit))
+            changes, cursor, has_more = changes_since(since, limit, changes_scope())
+            return {'changes': changes, 'cursor': cursor, 'has_more': has_more}
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+    def options(self):
+        return {'status': 'ok'}, 200
+
+api.add_resource(ChangesAPI, '/api/changes')
+
+class ChangesStreamAPI(Resource):
+    @auth_required('token')
+    def get(self):
+        # EventSource reconnects send Last-Event-ID; fall back to ?since=
+        since = request.headers.get('Last-Event-ID', type=int)
+        if since is None and request.args.get('since') == 'latest':
+            since = current_revision()
+        elif since is None:
+            since = request.args.get('since', default=0, type=int)
+        user_id = changes_scope()
+        poll_seconds = current_app.config.get('CHANGES_POLL_SECONDS', 2)
+        # Each open stream holds a worker, so end it periodically and let the client reconnect
+        timeout = current_app.config.get('CHANGES_STREAM_TIMEOUT', 25)
+        batch_size = current_app.config.get('TRANSACTIONS_MAX_PAGE_SIZE', 500)
+
+        def generate():
+            cursor = since
+            deadline = time.monotonic() + timeout
+            yield 'retry: 1000\n\n'
+            while time.monotonic() < deadline:
+                changes, cursor, has_more = changes_since(cursor, batch_size, user_id)
+                # End the read transaction so the next poll sees new commits and the connection is returned
+                db.session.rollback()
+                for change in changes:
+                    yield f'id: {change["revision"]}\nevent: change\ndata: {dumps(change)}\n\n'
+                if not has_more:
+                    yield ': keep-alive\n\n'
+                    time.sleep(poll_seconds)
+
+        response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    def options(self):
+        return {'status': 'ok'}, 200
+
+api.add_resource(ChangesStreamAPI, '/api/changes/stream')
+
+class JobAPI(Resource):
+    @auth_required('token')
+    def get(self, job_id):
+        try:
+            job = db.session.get(Job, job_id)
+            if job is None or not (is_admin() or job.user_id == current_user.id):
+                return {'error': 'Job not found'}, 404
+            return serialize_job(job)
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+    def options(self, job_id=None):
+        return {'status': 'ok'}, 200
+
+api.add_resource(JobAPI, '/api/jobs/<int:job_id>')
+
+class LaneAnalyticsAPI(Resource):
+    @auth_required('token')
+    def get(self):
+        if not is_admin():
+            return {'error': 'Admin access required'}, 403
+        tag = f'lanes-{current_revision()}-{args_fingerprint()}'
+        return conditional_json(tag, tag, self.build_lanes)
+
+    def build_lanes(self):
+        try:
+            max_lanes = current_app.config.get('ANALYTICS_MAX_LANES', 200)
+            limit = max(1, min(request.args.get('limit', default=20, type=int), max_lanes))
+            filters = {key: request.args.get(key) for key in ('source_city', 'destination_city')}
+            date_from = parse_date(request.args['date_from'], 'date_from') if request.args.get('date_from') else None
+            date_to = parse_date(request.args['date_to'], 'date_to') if request.args.get('date_to') else None
+
+            if request.args.get('by') == 'day':
+                date_to = date_to or datetime.date.today()
+                date_from = date_from or date_to - datetime.timedelta(days=29)
+                max_days = current_app.config.get('ANALYTICS_MAX_DAYS', 366)
+                if date_from > date_to or (date_to - date_from).days >= max_days:
+                    raise ValueError(f'date_from must be before date_to and at most {max_days} days apart')
+                window = request.args.get('window', type=int)
+                if window is not None and not 1 <= window <= max_days:
+                    raise ValueError(f'window must be between 1 and {max_days} days')
+                lanes = lane_series(filters, limit, date_from, date_to, window)
+            else:
+                lanes = lane_summary({**filters, 'date_from': date_from, 'date_to': date_to}, limit)
+
+            result = {'lanes': lanes, 'date_from': format_date(date_from), 'date_to': format_date(date_to)}
+            if has_pending_refresh():
+                # Writes are folded into the rollups by the analytics_refresh job, never on a GET;
+                # answer uncached so the next request sees the caught-up numbers
+                schedule_refresh()
+                return {**result, 'stale': True}, 200
+            return result
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        except Exception as e:
+            db.session.rollback()
+            return {'error': str(e)}, 500
+
+    def options(self):
+        return {'status': 'ok'}, 200
+
+api.add_resource(LaneAnalyticsAPI, '/api/analytics/lanes')
\ No newline at end of file
@@ -0,0 +1,99 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from flask import Response, current_app, request
+from werkzeug.http import quote_etag
+
+class ResponseCache:
+    """LRU of serialized JSON bodies, bounded by their total size in bytes.
+
+    Keys embed the data revision they were built from, so entries never need
+    invalidating; superseded ones just age out of the LRU. Bodies over
+    RESPONSE_CACHE_MAX_ENTRY_BYTES (e.g. a whole-table list) are never kept.
+    """
+
+    def __init__(self):
+        self.max_bytes = 0
+        self.max_entry_bytes = 0
+        self.ttl = 3600
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_bytes = app.config.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+        self.max_entry_bytes = min(app.config.get('RESPONSE_CACHE_MAX_ENTRY_BYTES', 1024 * 1024), self.max_bytes)
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', 3600)
+        self.clear()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, body):
+        if not self.max_bytes or len(body) > self.max_entry_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, body)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+response_cache = ResponseCache()
+
+def args_fingerprint():
+    items = sorted(request.args.items(multi=True))
+    return hashlib.sha1(repr(items).encode()).hexdigest()[:16]
+
+def conditional_json(tag, cache_key, build, last_modified=None):
+    """Answer 304 when the client already has `tag`, otherwise serve `build()` via the cache.
+
+    `build` is only called on a cache miss; if it returns a (body, status)
+    tuple that response is passed through uncached. A `cache_key` of None
+    keeps the ETag handling but never stores the body.
+    """
+    if request.if_none_match.contains(tag) or (
+            last_modified and not request.if_none_match and request.if_modified_since
+            and last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)):
+        response_cache.not_modified += 1
+        response = Response(status=304)
+    else:
+        body = response_cache.get(cache_key) if cache_key else None
+        if body is None:
+            result = build()
+            if isinstance(result, tuple):
+                return result
+            body = current_app.json.dumps(result).encode()
+            if cache_key:
+                response_cache.set(cache_key, body)
+        response = Response(body, mimetype='application/json')
+    response.headers['ETag'] = quote_etag(tag)
+    # Clients may keep the body but must revalidate before each use
+    response.headers['Cache-Control'] = 'private, no-cache'
+    if last_modified:
+        response.last_modified = last_modified
+    return response
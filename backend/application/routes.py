@@ -1,8 +1,9 @@
 from flask import request, jsonify, current_app
 from flask_security import auth_required, login_user, logout_user, current_user
 from application.models import User
-from application.database import db
-from werkzeug.security import check_password_hash, generate_password_hash
+from application.database import db, pool_status
+from application.auth_cache import user_cache
+from application.passwords import HasherBusy, password_hasher
 import uuid
 
 def register_routes(app):
@@ -24,6 +25,11 @@ def register_routes(app):
             'version': '1.0.0'
         })
 
+    @app.route('/api/health/db', methods=['GET'])
+    def db_health():
+        """Connection pool metrics for this worker"""
+        return jsonify(pool_status())
+
     @app.route('/api/login', methods=['POST', 'OPTIONS'])
     def login():
         if request.method == 'OPTIONS':
@@ -41,8 +47,15 @@ def register_routes(app):
                 return jsonify({'message': 'Username and password are required'}), 400
             
             user = User.query.filter_by(username=username).first()
+            stored_hash = user.password if user else None
+            # Give the connection back to the pool while the hash runs
+            db.session.commit()
             
-            if user and check_password_hash(user.password, password):
+            if user and password_hasher.verify(stored_hash, password):
+                if password_hasher.needs_rehash(stored_hash):
+                    # Hash settings changed since this password was stored; upgrade it while we have the plaintext
+                    user.password = password_hasher.hash(password)
+                    db.session.commit()
                 login_user(user)
                 # Generate auth token using Flask-Security method
                 auth_token = user.get_auth_token()
@@ -64,6 +77,9 @@ def register_routes(app):
             else:
                 return jsonify({'message': 'Invalid credentials'}), 401
                 
+        except HasherBusy:
+            db.session.rollback()
+            return jsonify({'message': 'Too many logins in progress, please retry shortly'}), 503, {'Retry-After': '1'}
         except Exception as e:
             current_app.logger.error(f"Login error: {str(e)}")
             return jsonify({'message': 'Login failed due to server error'}), 500
@@ -91,10 +107,12 @@ def register_routes(app):
             if User.query.filter_by(email=email).first():
                 return jsonify({'error': 'Email already exists'}), 400
             
+            # Give the connection back to the pool while the hash runs
+            db.session.commit()
             user = User(
                 username=username,
                 email=email,
-                password=generate_password_hash(password),
+                password=password_hasher.hash(password),
                 fs_uniquifier=str(uuid.uuid4())
             )
             
@@ -109,6 +127,9 @@ def register_routes(app):
             
             return jsonify({'message': 'User registered successfully'}), 201
             
+        except HasherBusy:
+            db.session.rollback()
+            return jsonify({'error': 'Too many requests in progress, please retry shortly'}), 503, {'Retry-After': '1'}
         except Exception as e:
             current_app.logger.error(f"Registration error: {str(e)}")
             db.session.rollback()
@@ -128,5 +149,6 @@ def register_routes(app):
     @app.route('/api/logout', methods=['POST'])
     @auth_required('token')
     def logout():
+        user_cache.delete(current_user.fs_uniquifier)
         logout_user()
         return jsonify({'message': 'Logged out successfully'})
\ No newline at end of file
@@ -0,0 +1,116 @@
+import logging
+import re
+import sqlalchemy as sa
+from application.database import db
+from application.models import Transaction
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'transaction_fts'
+FTS_COLUMNS = ('name', 'description', 'source_city', 'destination_city')
+# bm25 weights per column: a hit in the shipment name outranks one in the description
+FTS_WEIGHTS = (10.0, 1.0, 5.0, 5.0)
+MAX_TERMS = 8
+
+PG_INDEX = 'ix_transaction_search'
+# Queries must repeat this expression verbatim for Postgres to use the GIN index
+PG_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(source_city, '') || ' ' || coalesce(destination_city, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C')"
+)
+
+_backends = {}
+
+def search_terms(text):
+    return re.findall(r'\w+', (text or '').lower())[:MAX_TERMS]
+
+def _sqlite_ddl(table):
+    columns = ', '.join(FTS_COLUMNS)
+    new_values = ', '.join(f'new.{column}' for column in FTS_COLUMNS)
+    old_values = ', '.join(f'old.{column}' for column in FTS_COLUMNS)
+    insert_new = f'INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_values});'
+    delete_old = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    return {
+        f'{FTS_TABLE}_ai': f'CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {table} BEGIN {insert_new} END',
+        f'{FTS_TABLE}_ad': f'CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {table} BEGIN {delete_old} END',
+        # Status and date updates don't touch the index
+        f'{FTS_TABLE}_au': f'CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF {columns} ON {table} '
+                           f'BEGIN {delete_old} {insert_new} END',
+    }
+
+def ensure_search_index(engine=None):
+    """Create the full-text index for the current dialect, backfilling it when new.
+
+    SQLite gets an external-content FTS5 table kept in sync by triggers, so
+    ORM writes and bulk statements alike update it in the same transaction.
+    PostgreSQL gets a GIN expression index. Anything else falls back to LIKE.
+    """
+    engine = engine or db.engine
+    table = engine.dialect.identifier_preparer.quote(Transaction.__tablename__)
+    if engine.dialect.name == 'postgresql':
+        with engine.begin() as conn:
+            conn.execute(sa.text(f'CREATE INDEX IF NOT EXISTS {PG_INDEX} ON {table} USING gin (({PG_VECTOR}))'))
+        _backends[str(engine.url)] = 'postgresql'
+        return
+    if engine.dialect.name != 'sqlite':
+        _backends[str(engine.url)] = 'like'
+        return
+
+    triggers = _sqlite_ddl(table)
+    with engine.begin() as conn:
+        existing = set(conn.execute(
+            sa.text('SELECT name FROM sqlite_master WHERE name IN :names').bindparams(sa.bindparam('names', expanding=True)),
+            {'names': [FTS_TABLE, *triggers]}
+        ).scalars())
+        if existing == {FTS_TABLE, *triggers}:
+            _backends[str(engine.url)] = 'fts5'
+            return
+        try:
+            conn.execute(sa.text(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({", ".join(FTS_COLUMNS)}, '
+                f"content={table}, content_rowid='id', prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+            ))
+        except sa.exc.OperationalError:
+            logger.warning('SQLite was built without FTS5; /api/search will fall back to LIKE scans')
+            _backends[str(engine.url)] = 'like'
+            return
+        for name, ddl in triggers.items():
+            if name not in existing:
+                conn.execute(sa.text(ddl))
+        # Rows written while any trigger was missing are not indexed
+        conn.execute(sa.text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    _backends[str(engine.url)] = 'fts5'
+
+def search_backend(engine=None):
+    engine = engine or db.engine
+    key = str(engine.url)
+    if key not in _backends:
+        if engine.dialect.name == 'postgresql':
+            _backends[key] = 'postgresql'
+        elif engine.dialect.name == 'sqlite' and sa.inspect(engine).has_table(FTS_TABLE):
+            _backends[key] = 'fts5'
+        else:
+            _backends[key] = 'like'
+    return _backends[key]
+
+def ranked_matches(terms):
+    """Subquery of (id, rank) for transactions matching every term as a prefix; lower rank is better."""
+    backend = search_backend()
+    if backend == 'fts5':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+        statement = sa.text(
+            f'SELECT rowid AS id, bm25({FTS_TABLE}, {weights}) AS rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match'
+        ).bindparams(match=match)
+    elif backend == 'postgresql':
+        table = db.engine.dialect.identifier_preparer.quote(Transaction.__tablename__)
+        statement = sa.text(
+            f"SELECT id, -ts_rank({PG_VECTOR}, query) AS rank FROM {table}, to_tsquery('simple', :query) query "
+            f'WHERE {PG_VECTOR} @@ query'
+        ).bindparams(query=' & '.join(f'{term}:*' for term in terms))
+    else:
+        conditions = [sa.or_(*(getattr(Transaction, column).icontains(term, autoescape=True) for column in FTS_COLUMNS))
+                      for term in terms]
+        return sa.select(Transaction.id.label('id'), sa.literal(0.0).label('rank')).where(*conditions).subquery('search')
+    return statement.columns(id=sa.Integer, rank=sa.Float).subquery('search')
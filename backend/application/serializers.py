@@ -0,0 +1,146 @@
+import functools
+import json
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import select
+from application.models import Transaction, User
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def format_date(value):
+    return value.isoformat() if value else None
+
+def _same(value):
+    return value
+
+# Columns a transaction payload can be built from, by name
+COLUMNS = {
+    'id': Transaction.id,
+    'name': Transaction.name,
+    'user_id': Transaction.user_id,
+    'username': User.username,
+    'email': User.email,
+    'type': Transaction.type,
+    'date': Transaction.date,
+    'delivery_date': Transaction.delivery_date,
+    'source_city': Transaction.source_city,
+    'destination_city': Transaction.destination_city,
+    'internal_status': Transaction.internal_status,
+    'delivery_status': Transaction.delivery_status,
+    'description': Transaction.description,
+    'amount': Transaction.amount,
+    'updated_at': Transaction.updated_at,
+    'version': Transaction.version,
+    'revision': Transaction.revision,
+}
+
+# Output field -> (columns it needs, function of those column values)
+FIELDS = {
+    'id': (('id',), _same),
+    'name': (('name',), _same),
+    'user_id': (('user_id',), _same),
+    'user': (('username', 'email'),
+             lambda username, email: {'username': username, 'email': email} if username is not None else None),
+    'type': (('type',), _same),
+    'date': (('date',), format_date),
+    'delivery_date': (('delivery_date',), format_date),
+    'source_city': (('source_city',), _same),
+    'destination_city': (('destination_city',), _same),
+    'internal_status': (('internal_status',), _same),
+    'delivery_status': (('delivery_status',), _same),
+    'description': (('description',), _same),
+    'amount': (('amount',), _same),
+    'status': (('delivery_status',), _same),  # Map to frontend expected field
+    'payment_status': (('internal_status',), lambda status: 'paid' if status == 'paid' else 'pending'),
+    'created_at': (('date',), format_date),  # Using date as created_at
+    'updated_at': (('updated_at', 'date'), lambda updated_at, date: format_date(updated_at or date)),
+    'version': (('version',), _same),
+    'revision': (('revision',), _same),
+}
+
+ALL_FIELDS = tuple(FIELDS)
+
+def parse_fields(value):
+    """Turn a `?fields=a,b` sparse fieldset into a tuple of field names (all fields when empty)."""
+    if not value:
+        return ALL_FIELDS
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}; available: {', '.join(FIELDS)}")
+    return fields or ALL_FIELDS
+
+@functools.lru_cache(maxsize=128)
+def _plan(fields):
+    # id is always selected so callers can paginate and key rows by it
+    names = ['id']
+    for field in fields:
+        for column in FIELDS[field][0]:
+            if column not in names:
+                names.append(column)
+    position = {name: index for index, name in enumerate(names)}
+    # Plain copies and single-column conversions are split out to keep the per-row loop tight
+    copies = []
+    converted = []
+    combined = []
+    for field in fields:
+        columns, convert = FIELDS[field]
+        if convert is _same:
+            copies.append((field, position[columns[0]]))
+        elif len(columns) == 1:
+            converted.append((field, convert, position[columns[0]]))
+        else:
+            combined.append((field, convert, tuple(position[column] for column in columns)))
+    return tuple(names), tuple(copies), tuple(converted), tuple(combined)
+
+def transaction_columns(fields=ALL_FIELDS, model=Transaction):
+    # The archive table has the same column names as the hot one
+    return [COLUMNS[name] if model is Transaction or name in ('username', 'email') else getattr(model, name)
+            for name in _plan(fields)[0]]
+
+def transaction_select(fields=ALL_FIELDS, model=Transaction):
+    """SELECT of just the columns `fields` need, as plain tuples; no ORM objects are built."""
+    names = _plan(fields)[0]
+    statement = select(*transaction_columns(fields, model)).select_from(model)
+    if 'username' in names or 'email' in names:
+        statement = statement.outerjoin(User, User.id == model.user_id)
+    return statement
+
+def serialize_rows(rows, fields=ALL_FIELDS):
+    """Build payload dicts from rows of `transaction_select(fields)`."""
+    _, copies, converted, combined = _plan(fields)
+    items = []
+    for row in rows:
+        item = {field: row[index] for field, index in copies}
+        for field, convert, index in converted:
+            item[field] = convert(row[index])
+        for field, convert, indexes in combined:
+            item[field] = convert(*[row[index] for index in indexes])
+        items.append(item)
+    return items
+
+def serialize_transaction(transaction, fields=ALL_FIELDS):
+    user = transaction.user
+    values = {name: getattr(transaction, name) for name in COLUMNS if name not in ('username', 'email')}
+    values['username'] = user.username if user else None
+    values['email'] = user.email if user else None
+    return serialize_rows([tuple(values[name] for name in _plan(fields)[0])], fields)[0]
+
+if orjson is not None:
+    def dumps(value):
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+else:
+    def dumps(value):
+        return json.dumps(value, separators=(',', ':'))
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson when it is installed."""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        # Dates go through Flask's default() so responses look the same with either backend
+        return orjson.dumps(obj, default=self.default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME).decode()
@@ -0,0 +1,39 @@
+import os
+import random
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class FileSlots:
+    """A counting semaphore shared by every worker process on the host, made of flock'd lock files.
+
+    Holding a slot means holding an open, locked descriptor on one of
+    `count` files. The kernel drops a process's locks when it exits, so a
+    crashed worker can't leak a slot.
+    """
+
+    available = fcntl is not None
+
+    def __init__(self, directory, name, count):
+        os.makedirs(directory, exist_ok=True)
+        self.paths = [os.path.join(directory, f'{name}-{index}.lock') for index in range(count)]
+
+    def acquire(self):
+        """Lock a free slot without waiting; returns its descriptor, or None when all are taken."""
+        # Start somewhere random so concurrent callers don't all fight over the first files
+        start = random.randrange(len(self.paths))
+        for path in self.paths[start:] + self.paths[:start]:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    @staticmethod
+    def release(fd):
+        # Closing the descriptor releases its lock
+        os.close(fd)
@@ -0,0 +1,68 @@
+import threading
+from sqlalchemy import func, select, union_all
+from application.database import db
+from application.models import Transaction, TransactionArchive
+
+# Latest aggregates per (user scope, include archive), with None as the whole
+# system, tagged with the change-feed revision they were computed at. Every
+# write bumps the revision, so a hit is exact even across gunicorn workers
+_cache = {}
+_lock = threading.Lock()
+
+def _stats_source(user_id, include_archived):
+    columns = ('user_id', 'internal_status', 'delivery_status', 'amount')
+    selects = []
+    for model in (Transaction, TransactionArchive) if include_archived else (Transaction,):
+        query = select(*[getattr(model, column) for column in columns])
+        if user_id is not None:
+            query = query.where(model.user_id == user_id)
+        selects.append(query)
+    return (union_all(*selects) if include_archived else selects[0]).subquery()
+
+def compute_stats(user_id=None, include_archived=True):
+    source = _stats_source(user_id, include_archived)
+    rows = db.session.execute(
+        select(source.c.internal_status, source.c.delivery_status, func.count(),
+               func.coalesce(func.sum(source.c.amount), 0.0))
+        .group_by(source.c.internal_status, source.c.delivery_status)
+    ).all()
+    total_users = db.session.execute(select(func.count(func.distinct(source.c.user_id)))).scalar()
+
+    by_internal_status = {}
+    by_delivery_status = {}
+    for internal_status, delivery_status, count, amount in rows:
+        internal = by_internal_status.setdefault(internal_status, {'count': 0, 'amount': 0.0})
+        internal['count'] += count
+        internal['amount'] += float(amount)
+        delivery = by_delivery_status.setdefault(delivery_status, {'count': 0, 'amount': 0.0})
+        delivery['count'] += count
+        delivery['amount'] += float(amount)
+
+    total = sum(group['count'] for group in by_internal_status.values())
+    paid = by_internal_status.get('paid', {'count': 0, 'amount': 0.0})
+    return {
+        'total_transactions': total,
+        'total_amount': sum(group['amount'] for group in by_internal_status.values()),
+        'total_revenue': paid['amount'],
+        'pending_payments': total - paid['count'],
+        'in_transit': by_delivery_status.get('in_transit', {}).get('count', 0),
+        'delivered': by_delivery_status.get('delivered', {}).get('count', 0),
+        'active_shipments': sum(by_delivery_status.get(status, {}).get('count', 0)
+                                for status in ('pending', 'in_transit')),
+        'total_users': total_users or 0,
+        'by_internal_status': by_internal_status,
+        'by_delivery_status': by_delivery_status
+    }
+
+def get_stats(user_id=None, include_archived=True, revision=None):
+    key = (user_id, include_archived)
+    with _lock:
+        cached = _cache.get(key)
+    if revision is not None and cached and cached[0] == revision:
+        return cached[1]
+
+    stats = compute_stats(user_id, include_archived)
+    if revision is not None:
+        with _lock:
+            _cache[key] = (revision, stats)
+    return stats
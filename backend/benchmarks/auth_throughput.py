@@ -0,0 +1,65 @@
+"""Authenticated request throughput with and without the token cache.
+
+Revalidates one transaction with If-None-Match, so each request is little
+more than token authentication plus a 304. Runs --threads client threads
+against the in-process app with the cache on and off.
+
+    python benchmarks/auth_throughput.py --requests 5000 --threads 1
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import auth_headers, load_app, report, seed_transactions
+
+def run(app, headers, path, requests, threads):
+    samples = []
+    lock = threading.Lock()
+
+    def worker(count):
+        client = app.test_client(use_cookies=False)
+        local = []
+        for _ in range(count):
+            started = time.perf_counter()
+            response = client.get(path, headers=headers)
+            local.append(time.perf_counter() - started)
+            assert response.status_code == 304, response.status_code
+        with lock:
+            samples.extend(local)
+
+    workers = [threading.Thread(target=worker, args=(requests // threads,)) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--threads', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = load_app(directory)
+        seed_transactions(app, 10)
+        from application.auth_cache import user_cache
+
+        headers = auth_headers(app)
+        etag = app.test_client(use_cookies=False).get('/api/review_transaction/1', headers=headers).headers['ETag']
+        headers = {**headers, 'If-None-Match': etag}
+        for enabled in (False, True):
+            app.config['AUTH_CACHE_ENABLED'] = enabled
+            user_cache.init_app(app)
+            samples, seconds = run(app, headers, '/api/review_transaction/1', args.requests, args.threads)
+            label = 'token cache on' if enabled else 'token cache off'
+            report(label, samples)
+            print(f'{"":<32} {len(samples) / seconds:8.0f} requests/s')
+
+if __name__ == '__main__':
+    main()
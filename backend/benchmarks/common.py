@@ -0,0 +1,154 @@
+"""Helpers shared by the benchmark scripts: a throwaway database, a gunicorn server and latency percentiles."""
+import contextlib
+import datetime
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def bench_env(directory, **overrides):
+    """Environment for an app instance backed by a SQLite file in `directory`."""
+    env = dict(os.environ, FLASK_ENV='production', SECRET_KEY='bench', SECURITY_PASSWORD_SALT='bench',
+               DATABASE_URL=f"sqlite:///{os.path.join(directory, 'bench.db')}",
+               RATE_LIMIT_ENABLED='false', JOB_WORKER_THREADS='0')
+    env.update({key: str(value) for key, value in overrides.items()})
+    return env
+
+def flask_command(env, *args):
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', *args], cwd=BACKEND, env=env,
+                   check=True, capture_output=True)
+
+def init_database(env):
+    flask_command(env, 'db-init')
+    flask_command(env, 'seed')
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+@contextlib.contextmanager
+def gunicorn_server(env, startup_timeout=30):
+    """Run the app under gunicorn.conf.py on a free port and yield its base URL."""
+    port = free_port()
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'app:app', '-c', 'gunicorn.conf.py'],
+                               cwd=BACKEND, env=dict(env, PORT=str(port)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    try:
+        deadline = time.monotonic() + startup_timeout
+        while call(base, 'GET', '/api/health')[0] != 200:
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError('gunicorn did not start')
+            time.sleep(0.2)
+        yield base
+    finally:
+        process.terminate()
+        process.wait(10)
+
+def call(base, method, path, body=None, token=None, headers=None, timeout=60):
+    """Returns (status, body bytes, seconds); connection errors come back as status 0."""
+    headers = dict(headers or {})
+    data = None
+    if body is not None:
+        data = json.dumps(body).encode()
+        headers['Content-Type'] = 'application/json'
+    if token:
+        headers['Authentication-Token'] = token
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(base + path, data=data, headers=headers, method=method),
+                                    timeout=timeout) as response:
+            status, payload = response.status, response.read()
+    except urllib.error.HTTPError as e:
+        status, payload = e.code, e.read()
+    except OSError:
+        status, payload = 0, b''
+    return status, payload, time.perf_counter() - started
+
+def login(base, username='admin01', password='1234'):
+    status, payload, _ = call(base, 'POST', '/api/login', {'username': username, 'password': password})
+    if status != 200:
+        raise RuntimeError(f'login failed with {status}')
+    return json.loads(payload)['auth_token']
+
+CITIES = ('Chennai', 'Mumbai', 'Delhi', 'Kolkata', 'Bengaluru', 'Hyderabad', 'Pune', 'Jaipur', 'Lucknow', 'Surat')
+WORDS = ('pallet', 'crate', 'turbine', 'copper', 'steel', 'textile', 'fragile', 'frozen', 'pharma', 'granite',
+         'cotton', 'spare', 'parts', 'machinery', 'electronics', 'glass', 'paper', 'rubber', 'timber', 'cement')
+
+def load_app(directory, **overrides):
+    """Import the app against a fresh SQLite database in `directory`, with the schema and demo users in place."""
+    os.environ.update(bench_env(directory, **overrides))
+    sys.path.insert(0, BACKEND)
+    from app import app
+    from application.commands import init_db, seed_db
+    with app.app_context():
+        init_db()
+        seed_db()
+    return app
+
+def auth_headers(app, username='admin01', password='1234'):
+    response = app.test_client(use_cookies=False).post('/api/login', json={'username': username, 'password': password})
+    return {'Authentication-Token': response.get_json()['auth_token']}
+
+def seed_transactions(app, count, user_ids=(1, 2), batch_size=20000, seed=1):
+    """Bulk insert `count` shipments with varied users, lanes, statuses, dates and words to search for."""
+    from sqlalchemy import insert
+    from application.changes import allocate_revisions
+    from application.database import db
+    from application.models import DELIVERY_STATUSES, INTERNAL_STATUSES, Transaction
+
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    with app.app_context():
+        for start in range(0, count, batch_size):
+            size = min(batch_size, count - start)
+            first = allocate_revisions(db.session, size)
+            rows = []
+            for index in range(size):
+                date = today - datetime.timedelta(days=rng.randrange(730))
+                rows.append({
+                    'name': ' '.join(rng.sample(WORDS, 2)).title(),
+                    'user_id': rng.choice(user_ids),
+                    'type': 'delivery',
+                    'date': date,
+                    'delivery_date': date + datetime.timedelta(days=rng.randrange(1, 10)),
+                    'source_city': rng.choice(CITIES),
+                    'destination_city': rng.choice(CITIES),
+                    # Common words plus a rare SKU-like token, so searches can be broad or selective
+                    'description': ' '.join(rng.sample(WORDS, 4)) + f' sku{rng.randrange(100000)}',
+                    'amount': round(rng.uniform(10, 5000), 2),
+                    'internal_status': rng.choice(INTERNAL_STATUSES),
+                    'delivery_status': rng.choice(DELIVERY_STATUSES),
+                    'revision': first + index,
+                })
+            db.session.execute(insert(Transaction), rows)
+            db.session.commit()
+
+def timings(func, repeat):
+    """Call `func` `repeat` times and return the duration of each call in seconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def report(name, seconds):
+    """Print count, p50 and p99 in milliseconds for a list of durations."""
+    if not seconds:
+        print(f'{name:<32} no samples')
+        return
+    print(f'{name:<32} n={len(seconds):<7} p50={percentile(seconds, 0.5) * 1000:8.2f} ms  '
+          f'p99={percentile(seconds, 0.99) * 1000:8.2f} ms')
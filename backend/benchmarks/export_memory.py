@@ -0,0 +1,49 @@
+"""Peak Python memory of a full export as the table grows, streamed vs the unpaginated list.
+
+For each size in --rows, seeds up to that many shipments and measures
+tracemalloc peak and wall time for GET /api/export (NDJSON and CSV) and,
+for comparison, GET /api/get without a limit, which builds the whole body.
+
+    python benchmarks/export_memory.py --rows 10000 100000 500000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import auth_headers, load_app, seed_transactions
+
+def measure(client, headers, path):
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        response = client.get(path, headers=headers, buffered=False)
+        size = sum(len(chunk) for chunk in response.iter_encoded())
+        response.close()
+        return size, time.perf_counter() - started, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 50000, 200000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = load_app(directory, RESPONSE_CACHE_MAX_BYTES=0)
+        client = app.test_client(use_cookies=False)
+        headers = auth_headers(app)
+        seeded = 0
+        for rows in sorted(args.rows):
+            seed_transactions(app, rows - seeded, seed=rows)
+            seeded = rows
+            for path in ('/api/export?format=ndjson', '/api/export?format=csv', '/api/get'):
+                size, seconds, peak = measure(client, headers, path)
+                print(f'{rows:>8} rows  {path:<28} {size / 2 ** 20:8.1f} MB body  '
+                      f'{seconds:7.2f} s  peak {peak / 2 ** 20:8.1f} MB')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Job queue throughput: concurrent enqueues, then workers draining the queue.
+
+--producers threads enqueue --jobs jobs between them, timing each
+enqueue. Then --workers threads claim and run jobs until the queue is
+empty, and every job is checked to have succeeded exactly once.
+
+    python benchmarks/job_queue.py --jobs 5000 --producers 8 --workers 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import load_app, report
+
+def run_threads(count, target):
+    threads = [threading.Thread(target=target, args=(index,)) for index in range(count)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--jobs', type=int, default=2000)
+    parser.add_argument('--producers', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = load_app(directory)
+        from sqlalchemy import func, select
+        from application.database import db
+        from application.jobs import claim_jobs, enqueue, job_handler, run_job
+        from application.models import Job
+
+        @job_handler('benchmark_noop')
+        def noop(payload):
+            return payload
+
+        samples = []
+        lock = threading.Lock()
+
+        def produce(index):
+            local = []
+            with app.app_context():
+                for number in range(index, args.jobs, args.producers):
+                    started = time.perf_counter()
+                    enqueue('benchmark_noop', {'n': number})
+                    local.append(time.perf_counter() - started)
+            with lock:
+                samples.extend(local)
+
+        seconds = run_threads(args.producers, produce)
+        report(f'enqueue ({args.producers} threads)', samples)
+        print(f'{"":<32} {args.jobs / seconds:8.0f} jobs/s enqueued')
+
+        def work(index):
+            with app.app_context():
+                while True:
+                    claimed = claim_jobs(10)
+                    if not claimed:
+                        return
+                    for job_id in claimed:
+                        run_job(job_id)
+
+        seconds = run_threads(args.workers, work)
+        with app.app_context():
+            statuses = dict(db.session.execute(
+                select(Job.status, func.count()).where(Job.kind == 'benchmark_noop').group_by(Job.status)
+            ).all())
+            attempts = db.session.execute(
+                select(func.sum(Job.attempts)).where(Job.kind == 'benchmark_noop')
+            ).scalar()
+        print(f'{f"drain ({args.workers} threads)":<32} {args.jobs / seconds:8.0f} jobs/s  '
+              f'statuses {statuses}  attempts {attempts}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Read-request latency while a storm of logins hammers the password hasher.
+
+Starts gunicorn with threaded workers against a throwaway SQLite database,
+measures p50/p99 of an authenticated list read alone, then again while
+--storm threads log in as fast as they can. Compare runs with
+--host-slots 0 (per-worker cap only) and the default host-wide cap.
+
+    python benchmarks/login_storm.py --workers 4 --storm 64
+"""
+import argparse
+import collections
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import bench_env, call, gunicorn_server, init_database, login, report
+
+def read_latencies(base, token, seconds):
+    samples = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        status, _, elapsed = call(base, 'GET', '/api/get?limit=20', token=token)
+        if status == 200:
+            samples.append(elapsed)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='threads per worker')
+    parser.add_argument('--storm', type=int, default=32, help='concurrent login loops')
+    parser.add_argument('--seconds', type=float, default=10, help='duration of each phase')
+    parser.add_argument('--host-slots', type=int, default=None,
+                        help='PASSWORD_HASH_HOST_SLOTS (0 disables the host-wide cap)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        overrides = {'WEB_CONCURRENCY': args.workers, 'GUNICORN_THREADS': args.threads,
+                     'PASSWORD_HASH_LOCK_DIR': os.path.join(directory, 'hash-slots')}
+        if args.host_slots is not None:
+            overrides['PASSWORD_HASH_HOST_SLOTS'] = args.host_slots
+        env = bench_env(directory, **overrides)
+        init_database(env)
+        with gunicorn_server(env) as base:
+            token = login(base)
+            report('read, idle', read_latencies(base, token, args.seconds))
+
+            stop = threading.Event()
+            statuses = collections.Counter()
+            login_times = []
+
+            def storm():
+                while not stop.is_set():
+                    status, _, elapsed = call(base, 'POST', '/api/login', {'username': 'user01', 'password': '1234'})
+                    statuses[status] += 1
+                    if status == 200:
+                        login_times.append(elapsed)
+
+            threads = [threading.Thread(target=storm, daemon=True) for _ in range(args.storm)]
+            for thread in threads:
+                thread.start()
+            time.sleep(1)
+            report('read, during login storm', read_latencies(base, token, args.seconds))
+            stop.set()
+            for thread in threads:
+                thread.join()
+            report('successful logins', login_times)
+            print('login statuses', dict(statuses))
+
+if __name__ == '__main__':
+    main()
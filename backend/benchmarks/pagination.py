@@ -0,0 +1,55 @@
+"""p50/p99 latency per page of GET /api/get at a large table size.
+
+Seeds --rows shipments, then times first pages, deep pages (cursor taken
+at random ids across the table), filtered pages and a non-admin user's
+pages. The response cache is off so every request does the real work.
+
+    python benchmarks/pagination.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import auth_headers, load_app, report, seed_transactions, timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = load_app(directory, RESPONSE_CACHE_MAX_BYTES=0)
+        seed_transactions(app, args.rows)
+        client = app.test_client(use_cookies=False)
+        admin = auth_headers(app)
+        user = auth_headers(app, 'user01')
+        rng = random.Random(7)
+
+        def page(headers, query):
+            def fetch():
+                response = client.get(f'/api/get?limit={args.limit}&{query()}', headers=headers)
+                assert response.status_code == 200, response.status_code
+            return fetch
+
+        print(f'{args.rows} rows, {args.limit} per page')
+        cases = [
+            ('first page (admin)', admin, lambda: ''),
+            ('deep page (admin)', admin, lambda: f'cursor={rng.randrange(args.rows)}'),
+            ('deep page, newest first', admin, lambda: f'order=desc&cursor={rng.randrange(args.rows)}'),
+            ('deep page (own rows only)', user, lambda: f'cursor={rng.randrange(args.rows)}'),
+            ('delivery_status filter', admin, lambda: f'delivery_status=in_transit&cursor={rng.randrange(args.rows)}'),
+            ('lane + date range filter', admin,
+             lambda: 'source_city=Delhi&destination_city=Pune&date_from=2024-01-01&date_to=2030-01-01'),
+        ]
+        for name, headers, query in cases:
+            fetch = page(headers, query)
+            fetch()
+            report(name, timings(fetch, args.repeat))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Backend cost of a polling dashboard when nothing has changed.
+
+Each poll fetches a page of the list plus /api/stats, the way the
+dashboards do. The baseline sends no validators and has the response
+cache off; the revalidating client sends back the ETags it was given.
+Reports p50/p99 per poll and SQL statements per poll.
+
+    python benchmarks/polling.py --rows 200000
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import auth_headers, load_app, report, seed_transactions, timings
+
+PATHS = ('/api/get?limit=50', '/api/stats')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--polls', type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = load_app(directory)
+        seed_transactions(app, args.rows)
+        from application.database import count_queries
+        from application.response_cache import response_cache
+        from application import stats
+
+        client = app.test_client(use_cookies=False)
+        headers = auth_headers(app)
+        etags = {}
+
+        def poll(revalidate):
+            def run():
+                for path in PATHS:
+                    request_headers = {**headers, 'If-None-Match': etags[path]} if revalidate else headers
+                    response = client.get(path, headers=request_headers)
+                    assert response.status_code == (304 if revalidate else 200), response.status_code
+                    etags[path] = response.headers['ETag']
+                if not revalidate:
+                    # Every poll pays the full price, as before the caches existed
+                    response_cache.clear()
+                    stats._cache.clear()
+            return run
+
+        for revalidate, label in ((False, 'full responses, no caches'), (True, 'If-None-Match, unchanged')):
+            run = poll(revalidate)
+            run()
+            with app.app_context(), count_queries() as statements:
+                run()
+            report(label, timings(run, args.polls))
+            print(f'{"":<32} {len(statements)} SQL statements per poll')
+
+if __name__ == '__main__':
+    main()
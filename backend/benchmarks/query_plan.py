@@ -0,0 +1,63 @@
+"""Query plans and latency for the list filters, typed and indexed table vs the old untyped one.
+
+Seeds --rows shipments, copies them into a table shaped like the original
+model (string dates and statuses, no indexes), and runs the same access
+patterns against both: EXPLAIN QUERY PLAN plus p50/p99 per query.
+
+    python benchmarks/query_plan.py --rows 500000
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import load_app, report, seed_transactions, timings
+
+LEGACY = 'transaction_untyped'
+
+def queries(table, since):
+    # Same filters as the list endpoint; the untyped table compares dates as strings
+    return {
+        'user + date range': f'SELECT id FROM {table} WHERE user_id = 2 AND date >= :since ORDER BY id LIMIT 50',
+        'status + date range': f"SELECT id FROM {table} WHERE delivery_status = 'in_transit' AND date >= :since "
+                               f'ORDER BY date LIMIT 50',
+        'user keyset page': f'SELECT id FROM {table} WHERE user_id = 2 AND id > :cursor ORDER BY id LIMIT 50',
+        'pending payments count': f"SELECT count(*) FROM {table} WHERE internal_status = 'Payment Pending' "
+                                  f'AND date >= :since',
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = load_app(directory)
+        seed_transactions(app, args.rows)
+        from application.database import db
+
+        with app.app_context():
+            db.session.execute(sa.text(
+                f'CREATE TABLE {LEGACY} (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, date VARCHAR(100), '
+                f'delivery_status VARCHAR(100), internal_status VARCHAR(100))'
+            ))
+            db.session.execute(sa.text(
+                f'INSERT INTO {LEGACY} SELECT id, user_id, date, delivery_status, internal_status FROM "transaction"'
+            ))
+            db.session.commit()
+            since = (datetime.date.today() - datetime.timedelta(days=30)).isoformat()
+            params = {'since': since, 'cursor': args.rows // 2}
+            for label, table in (('typed + indexed', '"transaction"'), ('untyped, no indexes', LEGACY)):
+                print(f'== {label}')
+                for name, statement in queries(table, since).items():
+                    plan = db.session.execute(sa.text(f'EXPLAIN QUERY PLAN {statement}'), params).all()
+                    print(f'   {name}: ' + '; '.join(row[-1] for row in plan))
+                    report(f'   {name}',
+                           timings(lambda: db.session.execute(sa.text(statement), params).all(), args.repeat))
+
+if __name__ == '__main__':
+    main()
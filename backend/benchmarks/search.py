@@ -0,0 +1,57 @@
+"""GET /api/search latency against a LIKE scan over the same columns, at 1M rows by default.
+
+The LIKE baseline is what searching looked like without an index: a
+substring match on name, description and both cities, newest first.
+Selective terms show the index at work; LIKE only keeps up on broad
+terms, where the first rows it scans already fill a page.
+
+    python benchmarks/search.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import sqlalchemy as sa
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import auth_headers, load_app, report, seed_transactions, timings
+
+# Selective (a SKU matches ~1 row in 100k, a SKU prefix ~1 in 10k) and broad (common words match a quarter of rows)
+QUERIES = ('sku4242', 'sku424', 'sku4242 turbine', 'turbine', 'copper steel', 'Delhi pallet')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = load_app(directory, RESPONSE_CACHE_MAX_BYTES=0)
+        seed_transactions(app, args.rows)
+        from application.database import db
+        from application.search import search_backend
+
+        client = app.test_client(use_cookies=False)
+        headers = auth_headers(app)
+        with app.app_context():
+            print(f'{args.rows} rows, search backend: {search_backend()}')
+        like = sa.text(
+            'SELECT id FROM "transaction" WHERE '
+            + ' AND '.join(f"(name LIKE :t{i} OR description LIKE :t{i} OR source_city LIKE :t{i} "
+                           f"OR destination_city LIKE :t{i})" for i in range(2))
+            + ' ORDER BY id DESC LIMIT :limit'
+        )
+        for query in QUERIES:
+            def indexed():
+                response = client.get(f'/api/search?q={query}&limit={args.limit}', headers=headers)
+                assert response.status_code == 200, response.get_json()
+            report(f'search "{query}"', timings(indexed, args.repeat))
+
+            terms = (query.split() * 2)[:2]
+            params = {'t0': f'%{terms[0]}%', 't1': f'%{terms[1]}%', 'limit': args.limit}
+            with app.app_context():
+                report(f'LIKE "{query}"', timings(lambda: db.session.execute(like, params).all(), args.repeat))
+
+if __name__ == '__main__':
+    main()
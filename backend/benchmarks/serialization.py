@@ -0,0 +1,56 @@
+"""Cost of turning transactions into a JSON body, per --rows rows (10k by default).
+
+The ORM path loads Transaction objects with their user and encodes with
+the stdlib json module, as the list endpoints used to. The row path
+selects plain tuples with transaction_select() and encodes with the
+app's JSON provider (orjson when installed). A sparse fieldset is timed
+on the row path too.
+
+    python benchmarks/serialization.py --rows 10000 --fields id,name,amount,status
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import load_app, report, seed_transactions, timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--fields', default='id,name,amount,status,updated_at')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = load_app(directory)
+        seed_transactions(app, args.rows)
+        from sqlalchemy.orm import joinedload
+        from application.database import db
+        from application.models import Transaction
+        from application.serializers import parse_fields, serialize_rows, serialize_transaction, transaction_select
+
+        def orm():
+            transactions = Transaction.query.options(joinedload(Transaction.user)).limit(args.rows).all()
+            body = json.dumps([serialize_transaction(transaction) for transaction in transactions])
+            db.session.expunge_all()
+            return body
+
+        def rows(fields):
+            def run():
+                result = db.session.execute(transaction_select(fields).limit(args.rows)).all()
+                return app.json.dumps(serialize_rows(result, fields))
+            return run
+
+        fields = parse_fields(args.fields)
+        with app.app_context():
+            for label, func in (('ORM objects + json', orm), ('rows + app JSON', rows(parse_fields(None))),
+                                (f'rows, {len(fields)} fields', rows(fields))):
+                size = len(func())
+                report(label, timings(func, args.repeat))
+                print(f'{"":<32} {size / args.rows:8.0f} bytes/row')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Per-worker startup cost: time to import the app and serve the first requests, in fresh interpreters.
+
+Each run starts a new Python process, as a gunicorn worker boot would,
+and reports import time, the first /api/health request and the first
+authenticated request.
+
+    python benchmarks/startup.py --runs 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import BACKEND, bench_env, init_database, report
+
+PROBE = '''
+import json, time
+started = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+client = app.test_client(use_cookies=False)
+client.get('/api/health')
+health = time.perf_counter()
+token = client.post('/api/login', json={'username': 'admin01', 'password': '1234'}).get_json()['auth_token']
+logged_in = time.perf_counter()
+client.get('/api/get?limit=20', headers={'Authentication-Token': token})
+listed = time.perf_counter()
+print(json.dumps({'import': imported - started, 'health': health - imported, 'login': logged_in - health,
+                  'list': listed - logged_in}))
+'''
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = bench_env(directory)
+        init_database(env)
+        results = []
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, '-c', PROBE], cwd=BACKEND, env=env,
+                                    check=True, capture_output=True, text=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+        for step, label in (('import', 'import app'), ('health', 'first /api/health'),
+                            ('login', 'first login'), ('list', 'first /api/get page')):
+            report(label, [result[step] for result in results])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+import os
+
+# gunicorn reads this file from the working directory on startup
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+# Threaded workers, so one long request (a change stream, a password hash) doesn't block the whole worker
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+# Keep CHANGES_STREAM_TIMEOUT below this
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
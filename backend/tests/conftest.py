@@ -0,0 +1,103 @@
+import datetime
+import os
+import shutil
+import tempfile
+import pytest
+
+# app.py builds the app and its config at import time, so point it at a scratch database first
+_directory = tempfile.mkdtemp(prefix='logitrack-tests-')
+os.environ.update({
+    'FLASK_ENV': 'production',
+    'SECRET_KEY': 'test-secret',
+    'SECURITY_PASSWORD_SALT': 'test-salt',
+    'DATABASE_URL': f"sqlite:///{os.path.join(_directory, 'test.db')}",
+    'RATE_LIMIT_ENABLED': 'false',
+    'JOB_WORKER_THREADS': '0',
+    'ARCHIVE_INTERVAL_MINUTES': '0',
+    'IDEMPOTENCY_PURGE_INTERVAL_MINUTES': '0',
+    'ANALYTICS_REFRESH_INTERVAL_MINUTES': '0',
+    # Cheap hashes keep logins fast; the hashing path is the same
+    'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+    'PASSWORD_HASH_LOCK_DIR': os.path.join(_directory, 'password-hash'),
+    'MAX_CONCURRENT_LOCK_DIR': os.path.join(_directory, 'requests'),
+})
+
+from sqlalchemy import delete, insert
+from app import app as flask_app
+from application.changes import allocate_revisions
+from application.commands import init_db, seed_db
+from application.database import db
+from application.models import (IdempotencyKey, Job, LaneDailyRollup, LaneRollupDirty, Transaction,
+                                TransactionArchive, TransactionTombstone)
+from application.response_cache import response_cache
+from application import stats
+
+ADMIN_ID = 1
+USER_ID = 2
+
+@pytest.fixture(scope='session')
+def app():
+    with flask_app.app_context():
+        init_db()
+        seed_db()
+    yield flask_app
+    shutil.rmtree(_directory, ignore_errors=True)
+
+@pytest.fixture(autouse=True)
+def clean_tables(app):
+    yield
+    with app.app_context():
+        db.session.rollback()
+        # Transactions first: their triggers mark lane rollups dirty on delete
+        for model in (Transaction, TransactionArchive, TransactionTombstone, Job, IdempotencyKey,
+                      LaneRollupDirty, LaneDailyRollup):
+            db.session.execute(delete(model))
+        db.session.commit()
+    response_cache.clear()
+    stats._cache.clear()
+
+@pytest.fixture
+def client(app):
+    # No cookies, so each request is authenticated by its token alone
+    return app.test_client(use_cookies=False)
+
+def _login(app, username):
+    response = app.test_client(use_cookies=False).post('/api/login', json={'username': username, 'password': '1234'})
+    return {'Authentication-Token': response.get_json()['auth_token']}
+
+@pytest.fixture(scope='session')
+def admin_headers(app):
+    return _login(app, 'admin01')
+
+@pytest.fixture(scope='session')
+def user_headers(app):
+    return _login(app, 'user01')
+
+@pytest.fixture
+def add_transactions(app):
+    """Insert `count` transactions directly and return their ids; keyword arguments override column values."""
+    def add(count, **values):
+        today = datetime.date.today()
+        with app.app_context():
+            first = allocate_revisions(db.session, count)
+            rows = [{
+                'name': f'Shipment {index}',
+                'user_id': USER_ID,
+                'type': 'delivery',
+                'date': today,
+                'delivery_date': today + datetime.timedelta(days=3),
+                'source_city': 'Chennai',
+                'destination_city': 'Mumbai',
+                'description': 'Boxes of spare parts',
+                'amount': 100.0,
+                'internal_status': 'requested',
+                'delivery_status': 'pending',
+                'revision': first + index,
+                **values
+            } for index in range(count)]
+            ids = db.session.execute(
+                insert(Transaction).returning(Transaction.id, sort_by_parameter_order=True), rows
+            ).scalars().all()
+            db.session.commit()
+        return ids
+    return add
@@ -0,0 +1,118 @@
+import datetime
+from sqlalchemy import func, select
+from application.analytics import rebuild_lane_rollups, refresh_all_lane_rollups, schedule_refresh
+from application.commands import init_db
+from application.database import db
+from application.jobs import claim_jobs, run_job
+from application.models import Job, LaneDailyRollup, LaneRollupDirty
+
+TODAY = datetime.date.today()
+
+def days_ago(days):
+    return TODAY - datetime.timedelta(days=days)
+
+def dirty_count(app):
+    with app.app_context():
+        return db.session.execute(select(func.count()).select_from(LaneRollupDirty)).scalar()
+
+def rollups(app):
+    with app.app_context():
+        return sorted(tuple(row) for row in db.session.execute(
+            select(*[column for column in LaneDailyRollup.__table__.c if column.name != 'id'])
+        ).all())
+
+def queued_refreshes(app):
+    with app.app_context():
+        return db.session.execute(
+            select(Job.run_at).where(Job.kind == 'analytics_refresh', Job.status == 'queued')
+        ).scalars().all()
+
+def run_due_jobs(app):
+    with app.app_context():
+        while True:
+            claimed = claim_jobs(50)
+            if not claimed:
+                return
+            for job_id in claimed:
+                run_job(job_id)
+
+def test_triggers_mark_only_tracked_changes(app, client, admin_headers, add_transactions):
+    first, second = add_transactions(2)
+    assert dirty_count(app) == 2
+    assert client.put(f'/api/update/{first}', json={'name': 'Renamed'}, headers=admin_headers).status_code == 200
+    assert dirty_count(app) == 2
+    # Old and new lane/day are both touched
+    assert client.put(f'/api/update/{first}', json={'destination_city': 'Pune'},
+                      headers=admin_headers).status_code == 200
+    assert dirty_count(app) == 4
+    assert client.delete(f'/api/delete/{second}', headers=admin_headers).status_code == 200
+    assert dirty_count(app) == 5
+
+def test_incremental_refresh_matches_a_rebuild(app, client, admin_headers, add_transactions):
+    ids = add_transactions(4, date=days_ago(3), delivery_date=days_ago(1), delivery_status='delivered',
+                           internal_status='paid')
+    add_transactions(3, source_city='Delhi', date=days_ago(10), delivery_date=days_ago(2),
+                     delivery_status='delivered')
+    with app.app_context():
+        refresh_all_lane_rollups()
+    responses = [
+        client.put(f'/api/update/{ids[0]}', json={'date': days_ago(5).isoformat()}, headers=admin_headers),
+        client.put(f'/api/update/{ids[1]}', json={'amount': 999}, headers=admin_headers),
+        client.delete(f'/api/delete/{ids[2]}', headers=admin_headers),
+    ]
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    with app.app_context():
+        assert refresh_all_lane_rollups() > 0
+    refreshed = rollups(app)
+    assert dirty_count(app) == 0
+    with app.app_context():
+        rebuild_lane_rollups()
+    assert rollups(app) == refreshed
+
+def test_lane_summary_and_daily_windows(app, client, admin_headers, add_transactions):
+    for offset, count in ((2, 1), (1, 2), (0, 3)):
+        add_transactions(count, date=days_ago(offset), delivery_date=days_ago(offset), amount=10.0,
+                         delivery_status='delivered', internal_status='paid')
+    add_transactions(1, source_city='Delhi', date=days_ago(1))
+    with app.app_context():
+        refresh_all_lane_rollups()
+
+    summary = client.get('/api/analytics/lanes', headers=admin_headers).get_json()
+    assert 'stale' not in summary
+    busiest = summary['lanes'][0]
+    assert (busiest['source_city'], busiest['shipments'], busiest['revenue']) == ('Chennai', 6, 60.0)
+    assert busiest['on_time_rate'] == 1.0 and busiest['average_transit_days'] == 0.0
+
+    query = f'by=day&date_from={days_ago(1).isoformat()}&date_to={TODAY.isoformat()}&window=2&source_city=Chennai'
+    lanes = client.get(f'/api/analytics/lanes?{query}', headers=admin_headers).get_json()['lanes']
+    assert len(lanes) == 1
+    days = lanes[0]['days']
+    assert [day['day'] for day in days] == [days_ago(1).isoformat(), TODAY.isoformat()]
+    assert [day['shipments'] for day in days] == [2, 3]
+    # Windows reach back before date_from
+    assert [day['window']['shipments'] for day in days] == [3, 5]
+
+def test_reads_of_unrefreshed_rollups_are_flagged_stale(app, client, admin_headers, add_transactions):
+    add_transactions(2)
+    assert client.get('/api/analytics/lanes', headers=admin_headers).get_json()['stale'] is True
+    run_due_jobs(app)
+    result = client.get('/api/analytics/lanes', headers=admin_headers).get_json()
+    assert 'stale' not in result and result['lanes'][0]['shipments'] == 2
+
+def test_refresh_runs_periodically_without_reads(app, add_transactions, monkeypatch):
+    monkeypatch.setitem(app.config, 'ANALYTICS_REFRESH_INTERVAL_MINUTES', 5)
+    with app.app_context():
+        init_db()
+    assert len(queued_refreshes(app)) == 1
+    add_transactions(20)
+    run_due_jobs(app)
+    assert dirty_count(app) == 0
+    next_run, = queued_refreshes(app)
+    assert next_run > datetime.datetime.utcnow() + datetime.timedelta(minutes=4)
+    # A read still gets a refresh now rather than waiting for the next periodic one
+    add_transactions(1)
+    with app.app_context():
+        schedule_refresh()
+    assert len(queued_refreshes(app)) == 2
+    run_due_jobs(app)
+    assert dirty_count(app) == 0 and len(queued_refreshes(app)) == 1
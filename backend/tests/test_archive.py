@@ -0,0 +1,33 @@
+import datetime
+from application.archive import archive_transactions
+
+OLD = datetime.date.today() - datetime.timedelta(days=400)
+
+def test_archived_rows_stay_readable(app, client, admin_headers, add_transactions):
+    archived = add_transactions(2, date=OLD, delivery_status='delivered', internal_status='paid')
+    live = add_transactions(1, date=OLD, delivery_status='in_transit', internal_status='paid')
+    with app.app_context():
+        assert archive_transactions() == (2, False)
+    listed = client.get('/api/get?limit=50', headers=admin_headers).get_json()['items']
+    assert [item['id'] for item in listed] == live
+    with_history = client.get('/api/get?limit=50&include_archived=true', headers=admin_headers).get_json()['items']
+    assert [item['id'] for item in with_history] == archived + live
+    assert client.get(f'/api/review_transaction/{archived[0]}', headers=admin_headers).status_code == 200
+
+def test_ids_of_archived_rows_are_not_reused(app, add_transactions):
+    newest, = add_transactions(1, date=OLD, delivery_status='delivered', internal_status='paid')
+    with app.app_context():
+        assert archive_transactions() == (1, False)
+    assert add_transactions(1) == [newest + 1]
+
+def test_stats_keep_archived_shipments(app, client, admin_headers, add_transactions):
+    add_transactions(3, date=OLD, delivery_status='delivered', internal_status='paid', amount=50.0)
+    add_transactions(2, delivery_status='in_transit')
+    before = client.get('/api/stats', headers=admin_headers).get_json()
+    with app.app_context():
+        assert archive_transactions() == (3, False)
+    after = client.get('/api/stats', headers=admin_headers).get_json()
+    assert after['total_transactions'] == before['total_transactions'] == 5
+    assert after['total_revenue'] == before['total_revenue'] == 150.0
+    live = client.get('/api/stats?include_archived=false', headers=admin_headers).get_json()
+    assert live['total_transactions'] == 2
@@ -0,0 +1,31 @@
+from application.auth_cache import user_cache
+from application.database import count_queries, db
+from application.models import User
+
+def test_cached_token_skips_the_user_lookup(app, client, admin_headers, add_transactions):
+    transaction_id, = add_transactions(1)
+    path = f'/api/review_transaction/{transaction_id}'
+    headers = {**admin_headers, 'If-None-Match': client.get(path, headers=admin_headers).headers['ETag']}
+    with app.app_context(), count_queries() as cached:
+        assert client.get(path, headers=headers).status_code == 304
+    user_cache.clear()
+    with app.app_context(), count_queries() as uncached:
+        assert client.get(path, headers=headers).status_code == 304
+    assert len(cached) == 1
+    assert len(uncached) == 2 and 'FROM user' in uncached[0]
+
+def test_deactivated_user_is_evicted(app, client):
+    assert client.post('/api/register', json={'username': 'courier', 'email': 'courier@example.com',
+                                              'password': '1234'}).status_code == 201
+    token = client.post('/api/login', json={'username': 'courier', 'password': '1234'}).get_json()['auth_token']
+    headers = {'Authentication-Token': token, 'Accept': 'application/json'}
+    try:
+        assert client.get('/api/home', headers=headers).status_code == 200
+        with app.app_context():
+            User.query.filter_by(username='courier').one().active = False
+            db.session.commit()
+        assert client.get('/api/home', headers=headers).status_code == 401
+    finally:
+        with app.app_context():
+            db.session.delete(User.query.filter_by(username='courier').one())
+            db.session.commit()
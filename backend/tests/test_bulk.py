@@ -0,0 +1,44 @@
+import json
+from conftest import ADMIN_ID, USER_ID
+
+def shipment(name, **values):
+    return {'name': name, 'type': 'delivery', 'date': '2024-05-01', 'delivery_date': '2024-05-04',
+            'source_city': 'Chennai', 'destination_city': 'Mumbai', 'description': 'Crates', 'amount': 10, **values}
+
+def test_bulk_create_reports_each_row(client, user_headers):
+    rows = [shipment('a'), shipment('b', date='not a date'), shipment('c')]
+    result = client.post('/api/bulk/create', json=rows, headers=user_headers).get_json()
+    assert result['created'] == 2 and result['failed'] == 1
+    assert [('id' in row, row['row']) for row in result['results']] == [(True, 0), (False, 1), (True, 2)]
+
+def test_keyed_ndjson_import_is_created_once(client, user_headers):
+    body = '\n'.join(json.dumps(shipment(name)) for name in ('a', 'b'))
+    headers = {**user_headers, 'Idempotency-Key': 'manifest-1', 'Content-Type': 'application/x-ndjson'}
+    first = client.post('/api/bulk/create', data=body, headers=headers)
+    replay = client.post('/api/bulk/create', data=body, headers=headers)
+    assert first.get_json()['created'] == 2
+    assert replay.headers.get('Idempotent-Replayed') == 'true'
+    assert replay.get_json() == first.get_json()
+    assert len(client.get('/api/get?limit=50', headers=user_headers).get_json()['items']) == 2
+
+def test_bulk_status_update_is_admin_only(client, user_headers, admin_headers, add_transactions):
+    ids = add_transactions(3, user_id=USER_ID)
+    changes = {str(transaction_id): 'in_transit' for transaction_id in ids}
+    assert client.put('/api/bulk/update_delivery_status', json=changes, headers=user_headers).status_code == 403
+    result = client.put('/api/bulk/update_delivery_status', json={**changes, '999999': 'delivered'},
+                        headers=admin_headers).get_json()
+    assert result == {'updated': ids, 'not_found': [999999]}
+
+def test_admin_import_rejects_only_rows_with_unknown_owners(client, admin_headers, user_headers):
+    rows = [shipment(f'n{index}', user_id=USER_ID) for index in range(10)]
+    rows[3]['user_id'] = 999
+    result = client.post('/api/bulk/create', json=rows, headers=admin_headers).get_json()
+    assert result['created'] == 9 and result['failed'] == 1
+    assert [row for row in result['results'] if 'error' in row] == [{'row': 3, 'error': 'Unknown user_id: 999'}]
+    assert len(client.get('/api/get?limit=50', headers=user_headers).get_json()['items']) == 9
+
+def test_users_cannot_import_rows_for_someone_else(client, user_headers, admin_headers):
+    result = client.post('/api/bulk/create', json=[shipment('a', user_id=ADMIN_ID)], headers=user_headers).get_json()
+    assert result['created'] == 1
+    detail = client.get(f"/api/review_transaction/{result['results'][0]['id']}", headers=admin_headers)
+    assert detail.get_json()['user_id'] == USER_ID
@@ -0,0 +1,35 @@
+from flask import Flask
+from application.database import count_queries
+from application.response_cache import ResponseCache
+
+def test_unchanged_poll_gets_304_without_reading_rows(app, client, admin_headers, add_transactions):
+    add_transactions(30)
+    first = client.get('/api/get?limit=10', headers=admin_headers)
+    etag = first.headers['ETag']
+    with app.app_context():
+        with count_queries() as statements:
+            again = client.get('/api/get?limit=10', headers={**admin_headers, 'If-None-Match': etag})
+    assert again.status_code == 304
+    assert not any('FROM "transaction"' in statement for statement in statements)
+
+def test_writes_change_the_etag(client, admin_headers, add_transactions):
+    transaction_id, = add_transactions(1)
+    etag = client.get('/api/get?limit=10', headers=admin_headers).headers['ETag']
+    assert client.put(f'/api/update/{transaction_id}', json={'amount': 250}, headers=admin_headers).status_code == 200
+    response = client.get('/api/get?limit=10', headers={**admin_headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['items'][0]['amount'] == 250
+
+def test_response_cache_is_bounded_by_bytes():
+    app = Flask(__name__)
+    app.config.update(RESPONSE_CACHE_MAX_BYTES=10, RESPONSE_CACHE_MAX_ENTRY_BYTES=6)
+    cache = ResponseCache()
+    cache.init_app(app)
+    cache.set('a', b'1234')
+    cache.set('b', b'1234')
+    cache.get('a')
+    cache.set('c', b'1234')
+    cache.set('too-big', b'1234567')
+    assert cache.get('b') is None and cache.get('too-big') is None
+    assert cache.get('a') == b'1234' and cache.get('c') == b'1234'
+    assert cache.size == 8
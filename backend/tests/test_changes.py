@@ -0,0 +1,74 @@
+import json
+from conftest import ADMIN_ID
+from application.database import count_queries
+
+def changes(client, headers, **params):
+    query = '&'.join(f'{key}={value}' for key, value in params.items())
+    response = client.get(f'/api/changes?{query}', headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+def ops(feed):
+    return [(change['op'], change['id'] if change['op'] == 'delete' else change['transaction']['id'])
+            for change in feed['changes']]
+
+def stream_events(app, client, headers, path):
+    """The change events one /api/changes/stream connection sends, and the SQL statements it ran."""
+    with app.app_context(), count_queries() as statements:
+        body = client.get(path, headers=headers).get_data(as_text=True)
+    events = [dict(line.split(': ', 1) for line in block.split('\n'))
+              for block in body.split('\n\n') if block.startswith('id: ')]
+    return [(int(event['id']), json.loads(event['data'])) for event in events], statements
+
+def test_updates_and_deletes_merge_in_revision_order(client, admin_headers, add_transactions):
+    kept, removed = add_transactions(2)
+    start = changes(client, admin_headers, since='latest')['cursor']
+    assert client.put(f'/api/update/{kept}', json={'amount': 5}, headers=admin_headers).status_code == 200
+    assert client.delete(f'/api/delete/{removed}', headers=admin_headers).status_code == 200
+    feed = changes(client, admin_headers, since=start)
+    assert ops(feed) == [('upsert', kept), ('delete', removed)]
+    assert feed['changes'][0]['transaction']['amount'] == 5
+    revisions = [change['revision'] for change in feed['changes']]
+    assert revisions == sorted(revisions) and feed['cursor'] == revisions[-1]
+    assert changes(client, admin_headers, since=feed['cursor'])['changes'] == []
+
+def test_limit_pages_through_the_feed(client, admin_headers, add_transactions):
+    ids = add_transactions(3)
+    first = changes(client, admin_headers, since=0, limit=2)
+    assert ops(first) == [('upsert', ids[0]), ('upsert', ids[1])] and first['has_more']
+    rest = changes(client, admin_headers, since=first['cursor'], limit=2)
+    assert ops(rest) == [('upsert', ids[2])] and not rest['has_more']
+
+def test_since_latest_starts_from_the_head(client, user_headers, add_transactions):
+    add_transactions(2)
+    head = changes(client, user_headers, since='latest')
+    assert head['changes'] == [] and head['cursor'] > 0
+    new, = add_transactions(1)
+    assert ops(changes(client, user_headers, since=head['cursor'])) == [('upsert', new)]
+
+def test_users_only_see_their_own_changes(client, user_headers, admin_headers, add_transactions):
+    own, = add_transactions(1)
+    others = add_transactions(2, user_id=ADMIN_ID)
+    assert client.delete(f'/api/delete/{others[0]}', headers=admin_headers).status_code == 200
+    assert ops(changes(client, user_headers, since=0)) == [('upsert', own)]
+    assert ops(changes(client, admin_headers, since=0, user_id=ADMIN_ID)) == [('upsert', others[1]),
+                                                                            ('delete', others[0])]
+
+def test_stream_statement_count_does_not_grow_with_changes(app, client, admin_headers, add_transactions,
+                                                           monkeypatch):
+    # One poll per connection
+    monkeypatch.setitem(app.config, 'CHANGES_STREAM_TIMEOUT', 0.01)
+    monkeypatch.setitem(app.config, 'CHANGES_POLL_SECONDS', 0.02)
+    # Warm the token cache so both connections do the same auth work
+    changes(client, admin_headers, since='latest')
+    few = add_transactions(2)
+    client.delete(f'/api/delete/{few[1]}', headers=admin_headers)
+    events, small = stream_events(app, client, admin_headers, '/api/changes/stream?since=0')
+    assert [data['op'] for _, data in events] == ['upsert', 'delete']
+    assert [revision for revision, _ in events] == [data['revision'] for _, data in events]
+
+    add_transactions(40)
+    events, large = stream_events(app, client, admin_headers, '/api/changes/stream?since=0')
+    assert len(events) == 42
+    # One SELECT for upserts and one for tombstones, however many rows they return
+    assert len(small) == len(large) == 2
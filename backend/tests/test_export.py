@@ -0,0 +1,33 @@
+import csv
+import io
+import tracemalloc
+
+def peak_export_memory(client, headers):
+    tracemalloc.start()
+    try:
+        response = client.get('/api/export?format=ndjson', headers=headers, buffered=False)
+        lines = sum(chunk.count(b'\n') for chunk in response.iter_encoded())
+        response.close()
+        return lines, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def test_csv_export_has_header_and_rows(client, admin_headers, add_transactions):
+    add_transactions(3)
+    response = client.get('/api/export?format=csv', headers=admin_headers)
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0][:2] == ['id', 'name'] and len(rows) == 4
+    assert 'username' in rows[0]
+
+def test_export_memory_does_not_grow_with_rows(app, client, admin_headers, add_transactions):
+    app.config['EXPORT_BATCH_SIZE'] = 200
+    try:
+        add_transactions(1000)
+        small_lines, small_peak = peak_export_memory(client, admin_headers)
+        add_transactions(4000)
+        large_lines, large_peak = peak_export_memory(client, admin_headers)
+    finally:
+        app.config['EXPORT_BATCH_SIZE'] = 1000
+    assert (small_lines, large_lines) == (1000, 5000)
+    # Five times the rows, but only one batch is held at a time
+    assert large_peak < small_peak * 1.5
@@ -0,0 +1,43 @@
+import datetime
+import pytest
+from sqlalchemy import event
+from application.database import db
+from application.models import Transaction
+
+def list_statements(app, client, headers, query):
+    """The SELECTs on the transaction table that a /api/get request runs, with their parameters."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('SELECT') and 'FROM "transaction"' in statement:
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            assert client.get(f'/api/get?{query}', headers=headers).status_code == 200
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+    return statements
+
+def test_dates_and_amounts_are_typed_columns():
+    columns = Transaction.__table__.c
+    assert columns.date.type.python_type is datetime.date
+    assert columns.delivery_date.type.python_type is datetime.date
+    assert columns.amount.type.python_type is float
+
+@pytest.mark.parametrize('query, index', [
+    ('limit=20&user_id=2', 'ix_transaction_user_id_id'),
+    ('limit=20&delivery_status=in_transit&date_from=2024-01-01', 'ix_transaction_delivery_status_date'),
+    ('limit=20&source_city=Delhi&destination_city=Mumbai', 'ix_transaction_lane_date'),
+])
+def test_list_filters_use_an_index(app, client, admin_headers, add_transactions, query, index):
+    add_transactions(20)
+    statements = list_statements(app, client, admin_headers, query)
+    assert statements
+    with app.app_context():
+        connection = db.session.connection()
+        for statement, parameters in statements:
+            plan = '; '.join(row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}',
+                                                                            parameters))
+            assert index in plan, plan
@@ -0,0 +1,46 @@
+import threading
+from sqlalchemy import func, select
+from application.database import db
+from application.jobs import claim_jobs, enqueue, job_handler, run_job
+from application.models import Job, Transaction
+
+@job_handler('test_echo')
+def echo_job(payload):
+    return payload
+
+def drain(app):
+    with app.app_context():
+        while True:
+            claimed = claim_jobs(50)
+            if not claimed:
+                return
+            for job_id in claimed:
+                run_job(job_id)
+
+def test_concurrent_enqueues_each_run_once(app):
+    def producer(offset):
+        with app.app_context():
+            for index in range(25):
+                enqueue('test_echo', {'n': offset + index})
+
+    threads = [threading.Thread(target=producer, args=(offset * 100,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    drain(app)
+    with app.app_context():
+        statuses = db.session.execute(
+            select(Job.status, func.count()).where(Job.kind == 'test_echo').group_by(Job.status)
+        ).all()
+    assert dict(statuses) == {'succeeded': 200}
+
+def test_async_payment_returns_a_job_to_poll(app, client, user_headers, add_transactions):
+    transaction_id, = add_transactions(1)
+    response = client.post(f'/api/pay/{transaction_id}', headers={**user_headers, 'Prefer': 'respond-async'})
+    assert response.status_code == 202
+    drain(app)
+    job = client.get(response.headers['Location'], headers=user_headers).get_json()
+    assert job['status'] == 'succeeded'
+    with app.app_context():
+        assert db.session.get(Transaction, transaction_id).internal_status == 'paid'
@@ -0,0 +1,31 @@
+import pytest
+from flask import Flask
+from werkzeug.security import generate_password_hash
+from application.passwords import HasherBusy, HostSlots, PasswordHasher, method_prefix
+from application.slots import FileSlots
+
+def test_password_hashing_turns_callers_away_when_the_host_queue_is_full(tmp_path):
+    host = HostSlots(str(tmp_path), slots=1, queue=0)
+    ticket = host.admit()
+    with pytest.raises(HasherBusy):
+        host.admit()
+    assert host.run(ticket, 0, lambda value: value * 2, 21) == 42
+    FileSlots.release(host.admit())
+
+@pytest.mark.parametrize('method', ['scrypt', 'scrypt:16384:8:1', 'pbkdf2', 'pbkdf2:sha512', 'pbkdf2:sha256:1000'])
+def test_method_prefix_matches_what_werkzeug_stores(method):
+    assert method_prefix(method) == generate_password_hash('', method).split('$', 1)[0]
+
+def test_rehash_check_never_hashes(monkeypatch):
+    app = Flask(__name__)
+    app.config.update(PASSWORD_HASH_METHOD='scrypt', PASSWORD_HASH_LOCK_DIR=None)
+    hasher = PasswordHasher()
+    hasher.init_app(app)
+
+    def busy(*args):
+        raise HasherBusy('Password hashing queue is full')
+
+    # Even with the queue full, checking a stored hash after a successful login must not be refused
+    monkeypatch.setattr(hasher, '_run', busy)
+    assert not hasher.needs_rehash(generate_password_hash('1234', 'scrypt'))
+    assert hasher.needs_rehash(generate_password_hash('1234', 'pbkdf2:sha256:1000'))
@@ -0,0 +1,47 @@
+import contextlib
+import pytest
+from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
+from application.ratelimit import RateLimiter, _refill
+from application.slots import FileSlots
+
+def test_token_bucket_refills_up_to_burst():
+    assert _refill(0, 10, rate=1, burst=5) == (4, 0.0)
+    tokens, wait = _refill(0.5, 0, rate=2, burst=5)
+    assert tokens == 0.5 and wait == 0.25
+
+def test_file_slots_are_shared_until_released(tmp_path):
+    slots = FileSlots(str(tmp_path), 'request', 2)
+    # A second instance stands in for another worker process
+    other = FileSlots(str(tmp_path), 'request', 2)
+    held = [slots.acquire(), other.acquire()]
+    assert None not in held
+    assert other.acquire() is None
+    FileSlots.release(held.pop())
+    assert other.acquire() is not None
+
+def test_forwarded_addresses_are_trusted_for_one_proxy(app):
+    assert isinstance(app.wsgi_app, ProxyFix)
+    assert app.wsgi_app.x_for == 1
+
+@pytest.mark.parametrize('host_wide', [True, False])
+def test_open_streams_have_their_own_in_flight_cap(tmp_path, host_wide):
+    app = Flask(__name__)
+    app.config.update(RATE_LIMIT_READ_PER_MINUTE=0, MAX_CONCURRENT_REQUESTS=1, MAX_CONCURRENT_STREAMS=2,
+                      MAX_CONCURRENT_LOCK_DIR=str(tmp_path) if host_wide else '')
+    app.add_url_rule('/stream', 'changesstreamapi', lambda: '')
+    app.add_url_rule('/list', 'list', lambda: '')
+    RateLimiter().init_app(app)
+
+    def status(stack, path):
+        # Each request keeps its slot until the stack unwinds and tears it down
+        stack.enter_context(app.app_context())
+        stack.enter_context(app.test_request_context(path))
+        response = app.preprocess_request()
+        return response.status_code if response else 200
+
+    with contextlib.ExitStack() as stack:
+        assert [status(stack, '/stream') for _ in range(3)] == [200, 200, 503]
+        assert [status(stack, '/list') for _ in range(2)] == [200, 503]
+    with contextlib.ExitStack() as stack:
+        assert status(stack, '/stream') == 200 and status(stack, '/list') == 200
@@ -0,0 +1,22 @@
+def search(client, headers, q):
+    response = client.get(f'/api/search?q={q}', headers=headers)
+    assert response.status_code == 200
+    return [item['id'] for item in response.get_json()['items']]
+
+def test_name_matches_rank_above_description_matches(client, admin_headers, add_transactions):
+    in_description, = add_transactions(1, name='Crates', description='Pallet of turbines')
+    in_name, = add_transactions(1, name='Turbine blades', description='Fragile')
+    add_transactions(5, name='Unrelated', description='Nothing to see')
+    assert search(client, admin_headers, 'turbin') == [in_name, in_description]
+
+def test_index_follows_updates(client, admin_headers, add_transactions):
+    transaction_id, = add_transactions(1, name='Copper wire')
+    assert search(client, admin_headers, 'copper') == [transaction_id]
+    client.put(f'/api/update/{transaction_id}', json={'name': 'Steel beams'}, headers=admin_headers)
+    assert search(client, admin_headers, 'copper') == []
+    assert search(client, admin_headers, 'steel') == [transaction_id]
+
+def test_search_is_scoped_to_the_caller(client, user_headers, add_transactions):
+    own, = add_transactions(1, name='Granite slabs')
+    add_transactions(1, name='Granite tiles', user_id=1)
+    assert search(client, user_headers, 'granite') == [own]
@@ -0,0 +1,11 @@
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_importing_the_app_does_not_touch_the_database(tmp_path):
+    database = tmp_path / 'untouched.db'
+    env = dict(os.environ, FLASK_ENV='production', DATABASE_URL=f'sqlite:///{database}')
+    subprocess.run([sys.executable, '-c', 'import app'], cwd=BACKEND, env=env, check=True)
+    assert not database.exists()
@@ -0,0 +1,70 @@
+from conftest import ADMIN_ID, USER_ID
+from application.database import count_queries, db
+from application.models import Transaction
+from application.serializers import serialize_rows, serialize_transaction, transaction_select
+
+def list_page(client, headers, **params):
+    query = '&'.join(f'{key}={value}' for key, value in params.items())
+    response = client.get(f'/api/get?{query}', headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_cursor_pages_cover_every_row_once(client, admin_headers, add_transactions):
+    ids = add_transactions(25)
+    seen = []
+    page = list_page(client, admin_headers, limit=10)
+    while True:
+        seen.extend(item['id'] for item in page['items'])
+        if page['next_cursor'] is None:
+            break
+        page = list_page(client, admin_headers, limit=10, cursor=page['next_cursor'])
+    assert seen == sorted(ids)
+
+def test_users_only_list_their_own_shipments(client, user_headers, admin_headers, add_transactions):
+    own = add_transactions(3)
+    add_transactions(2, user_id=ADMIN_ID)
+    assert [item['id'] for item in list_page(client, user_headers, limit=50)['items']] == own
+    assert len(list_page(client, admin_headers, limit=50)['items']) == 5
+
+def test_filters_narrow_the_listing(client, admin_headers, add_transactions):
+    add_transactions(4, delivery_status='in_transit')
+    add_transactions(2, delivery_status='delivered', source_city='Delhi')
+    assert len(list_page(client, admin_headers, limit=50, delivery_status='in_transit')['items']) == 4
+    assert len(list_page(client, admin_headers, limit=50, source_city='Delhi')['items']) == 2
+
+def test_statement_count_does_not_grow_with_page_size(app, client, admin_headers, add_transactions):
+    add_transactions(60, user_id=USER_ID)
+    add_transactions(60, user_id=ADMIN_ID)
+    # Warm the token cache so both requests do the same auth work
+    list_page(client, admin_headers, limit=1)
+    with app.app_context():
+        with count_queries() as small:
+            assert len(list_page(client, admin_headers, limit=5)['items']) == 5
+        with count_queries() as large:
+            assert len(list_page(client, admin_headers, limit=120)['items']) == 120
+    assert len(small) == len(large)
+
+def test_detail_embeds_the_owner(client, admin_headers, add_transactions):
+    transaction_id, = add_transactions(1)
+    detail = client.get(f'/api/review_transaction/{transaction_id}', headers=admin_headers).get_json()
+    assert detail['user']['username'] == 'user01'
+
+def test_detail_honours_fields(client, admin_headers, add_transactions):
+    transaction_id, = add_transactions(1)
+    sparse = client.get(f'/api/review_transaction/{transaction_id}?fields=id,amount', headers=admin_headers)
+    assert sparse.get_json() == {'id': transaction_id, 'amount': 100.0}
+
+def test_list_honours_fields(client, admin_headers, add_transactions):
+    ids = add_transactions(2)
+    page = list_page(client, admin_headers, limit=10, fields='id,status,payment_status')
+    assert page['items'] == [{'id': transaction_id, 'status': 'pending', 'payment_status': 'pending'}
+                             for transaction_id in ids]
+    response = client.get('/api/get?limit=10&fields=id,nope', headers=admin_headers)
+    assert response.status_code == 400
+
+def test_row_and_orm_serializers_agree(app, add_transactions):
+    add_transactions(3)
+    with app.app_context():
+        rows = db.session.execute(transaction_select().order_by(Transaction.id)).all()
+        transactions = Transaction.query.order_by(Transaction.id).all()
+        assert serialize_rows(rows) == [serialize_transaction(transaction) for transaction in transactions]
@@ -0,0 +1,85 @@
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session
+from conftest import ADMIN_ID, USER_ID
+from application.database import db
+from application.models import Transaction
+
+def stored(app, transaction_id):
+    with app.app_context():
+        return db.session.get(Transaction, transaction_id)
+
+def test_update_only_writes_editable_columns(app, client, user_headers, add_transactions):
+    transaction_id, = add_transactions(1)
+    path = f'/api/update/{transaction_id}'
+    assert client.put(path, json={'user_id': ADMIN_ID}, headers=user_headers).status_code == 403
+    assert client.put(path, json={'internal_status': 'paid'}, headers=user_headers).status_code == 400
+    assert client.put(path, json={'revision_of_doom': 1}, headers=user_headers).status_code == 400
+    assert client.put(path, json={'amount': 'lots'}, headers=user_headers).status_code == 400
+    transaction = stored(app, transaction_id)
+    assert (transaction.user_id, transaction.internal_status, transaction.amount) == (USER_ID, 'requested', 100.0)
+
+def test_a_read_payload_can_be_sent_back(app, client, user_headers, add_transactions):
+    transaction_id, = add_transactions(1)
+    payload = client.get(f'/api/review_transaction/{transaction_id}', headers=user_headers).get_json()
+    payload.update(amount=75, status='in_transit')
+    assert client.put(f'/api/update/{transaction_id}', json=payload, headers=user_headers).status_code == 200
+    transaction = stored(app, transaction_id)
+    assert (transaction.amount, transaction.delivery_status, transaction.user_id) == (75.0, 'in_transit', USER_ID)
+
+def test_admins_can_reassign_to_existing_users(app, client, admin_headers, add_transactions):
+    transaction_id, = add_transactions(1)
+    path = f'/api/update/{transaction_id}'
+    assert client.put(path, json={'user_id': 999}, headers=admin_headers).status_code == 400
+    assert client.put(path, json={'user_id': ADMIN_ID}, headers=admin_headers).status_code == 200
+    assert stored(app, transaction_id).user_id == ADMIN_ID
+
+def test_if_match_mismatch_is_a_precondition_failure(app, client, user_headers, add_transactions):
+    transaction_id, = add_transactions(1)
+    etag = client.get(f'/api/review_transaction/{transaction_id}', headers=user_headers).headers['ETag']
+    path = f'/api/update/{transaction_id}'
+    assert client.put(path, json={'amount': 1}, headers={**user_headers, 'If-Match': etag}).status_code == 200
+    # The first write moved the version on, so the same ETag is now stale
+    stale = client.put(path, json={'amount': 2}, headers={**user_headers, 'If-Match': etag})
+    assert stale.status_code == 412 and stale.headers['ETag'] != etag
+    assert client.put(path, json={'amount': 2, 'version': 1}, headers=user_headers).status_code == 412
+    assert stored(app, transaction_id).amount == 1.0
+
+def test_concurrent_write_between_read_and_flush_is_a_conflict(app, client, user_headers, add_transactions):
+    transaction_id, = add_transactions(1)
+
+    def bump_version(session, flush_context, instances):
+        # Another request commits first, after this one loaded the row
+        session.connection().execute(
+            update(Transaction).where(Transaction.id == transaction_id).values(version=Transaction.version + 1)
+        )
+
+    event.listen(Session, 'before_flush', bump_version, once=True)
+    try:
+        response = client.put(f'/api/update/{transaction_id}', json={'amount': 5}, headers=user_headers)
+    finally:
+        if event.contains(Session, 'before_flush', bump_version):
+            event.remove(Session, 'before_flush', bump_version)
+    assert response.status_code == 409
+    assert stored(app, transaction_id).amount == 100.0
+
+def test_keyed_create_is_replayed(app, client, user_headers):
+    body = {'name': 'Pallets', 'amount': 20, 'delivery_date': '2024-06-01'}
+    headers = {**user_headers, 'Idempotency-Key': 'create-1'}
+    first = client.post('/api/create', json=body, headers=headers)
+    replay = client.post('/api/create', json=body, headers=headers)
+    assert first.status_code == replay.status_code == 201
+    assert replay.headers.get('Idempotent-Replayed') == 'true'
+    assert replay.get_json()['id'] == first.get_json()['id']
+    assert client.post('/api/create', json={**body, 'amount': 21}, headers=headers).status_code == 422
+    assert len(client.get('/api/get?limit=50', headers=user_headers).get_json()['items']) == 1
+
+def test_keyed_payment_is_applied_once(app, client, user_headers, add_transactions):
+    transaction_id, = add_transactions(1)
+    headers = {**user_headers, 'Idempotency-Key': 'pay-1'}
+    first = client.post(f'/api/pay/{transaction_id}', headers=headers)
+    revision = stored(app, transaction_id).revision
+    replay = client.post(f'/api/pay/{transaction_id}', headers=headers)
+    assert first.get_json() == replay.get_json() == {'message': 'Payment processed successfully'}
+    assert replay.headers.get('Idempotent-Replayed') == 'true'
+    transaction = stored(app, transaction_id)
+    assert transaction.internal_status == 'paid' and transaction.revision == revision
@@ -9,11 +9,13 @@ export interface Transaction {
   id: number
   user_id: number
   amount: number
-  delivery_date: string
+  delivery_date: string | null
   status: string
   payment_status: string
   created_at: string
   updated_at: string
+  version?: number
+  revision?: number
   name?: string
   type?: string
   date?: string
@@ -26,17 +28,47 @@ export interface Transaction {
   }
 }
 
+export interface TransactionStats {
+  total_transactions: number
+  total_amount: number
+  total_revenue: number
+  pending_payments: number
+  in_transit: number
+  delivered: number
+  active_shipments: number
+  total_users: number
+  by_internal_status: Record<string, { count: number; amount: number }>
+  by_delivery_status: Record<string, { count: number; amount: number }>
+}
+
+interface TransactionChange {
+  op: 'upsert' | 'delete'
+  revision: number
+  id?: number
+  transaction?: Transaction
+}
+
 export const useTransactionsStore = defineStore('transactions', () => {
   const transactions = ref<Transaction[]>([])
+  const recentTransactions = ref<Transaction[]>([])
+  const stats = ref<TransactionStats | null>(null)
   const loading = ref(false)
+  // Change-feed position the local list is in sync with
+  const changeCursor = ref<number | null>(null)
+  // False until the full list has been fetched; before that, synced changes only cover recent writes
+  const loaded = ref(false)
 
   const fetchTransactions = async () => {
     loading.value = true
     try {
       console.log('Fetching transactions...')
+      // Read the feed head first so changes racing with the list load get replayed, not lost
+      const head = await api.get('/api/changes', { params: { since: 'latest' } })
       const response = await api.get('/api/get')
       console.log('Transactions response:', response.data)
       transactions.value = response.data
+      changeCursor.value = head.data.cursor
+      loaded.value = true
     } catch (error: any) {
       console.error('Failed to fetch transactions:', error)
       toast.error('Failed to fetch transactions')
@@ -45,13 +77,86 @@ export const useTransactionsStore = defineStore('transactions', () => {
     }
   }
 
+  const applyChanges = (changes: TransactionChange[]) => {
+    for (const change of changes) {
+      const id = change.op === 'delete' ? change.id : change.transaction?.id
+      const index = transactions.value.findIndex(t => t.id === id)
+      if (change.op === 'delete') {
+        if (index !== -1) transactions.value.splice(index, 1)
+      } else if (change.transaction) {
+        if (index !== -1) transactions.value[index] = change.transaction
+        else transactions.value.push(change.transaction)
+      }
+    }
+  }
+
+  // Pull only what changed since the last sync instead of refetching the whole list
+  const syncTransactions = async () => {
+    if (changeCursor.value === null) {
+      await fetchTransactions()
+      return
+    }
+    try {
+      let hasMore = true
+      while (hasMore) {
+        const response = await api.get('/api/changes', { params: { since: changeCursor.value } })
+        applyChanges(response.data.changes)
+        changeCursor.value = response.data.cursor
+        hasMore = response.data.has_more
+      }
+    } catch (error: any) {
+      console.error('Failed to sync transactions:', error)
+      await fetchTransactions()
+    }
+  }
+
+  const fetchStats = async () => {
+    try {
+      const response = await api.get('/api/stats')
+      stats.value = response.data
+    } catch (error: any) {
+      console.error('Failed to fetch stats:', error)
+      toast.error('Failed to fetch stats')
+    }
+  }
+
+  const fetchRecentTransactions = async (limit = 10) => {
+    loading.value = true
+    try {
+      const response = await api.get('/api/get', { params: { limit, order: 'desc' } })
+      recentTransactions.value = response.data.items
+    } catch (error: any) {
+      console.error('Failed to fetch recent transactions:', error)
+      toast.error('Failed to fetch transactions')
+    } finally {
+      loading.value = false
+    }
+  }
+
+  const fetchChangeCursor = async () => {
+    try {
+      const head = await api.get('/api/changes', { params: { since: 'latest' } })
+      changeCursor.value = head.data.cursor
+    } catch (error: any) {
+      console.error('Failed to read the change feed head:', error)
+    }
+  }
+
+  const fetchDashboard = async (limit = 10) => {
+    // Start following the feed here so writes made from the dashboard sync instead of refetching everything
+    const cursor = changeCursor.value === null ? fetchChangeCursor() : Promise.resolve()
+    await Promise.all([fetchStats(), fetchRecentTransactions(limit), cursor])
+  }
+
   const createTransaction = async (transactionData: Partial<Transaction>) => {
     loading.value = true
     try {
       console.log('Creating transaction:', transactionData)
-      const response = await api.post('/api/create', transactionData)
+      const response = await api.post('/api/create', transactionData, {
+        headers: { 'Idempotency-Key': crypto.randomUUID() }
+      })
       console.log('Create transaction response:', response.data)
-      await fetchTransactions()
+      await syncTransactions()
       toast.success('Transaction created successfully!')
       return true
     } catch (error: any) {
@@ -68,7 +173,7 @@ export const useTransactionsStore = defineStore('transactions', () => {
     loading.value = true
     try {
       await api.put(`/api/update/${id}`, transactionData)
-      await fetchTransactions()
+      await syncTransactions()
       toast.success('Transaction updated successfully!')
       return true
     } catch (error: any) {
@@ -84,7 +189,7 @@ export const useTransactionsStore = defineStore('transactions', () => {
     loading.value = true
     try {
       await api.delete(`/api/delete/${id}`)
-      await fetchTransactions()
+      await syncTransactions()
       toast.success('Transaction deleted successfully!')
       return true
     } catch (error: any) {
@@ -99,8 +204,10 @@ export const useTransactionsStore = defineStore('transactions', () => {
   const payTransaction = async (id: number) => {
     loading.value = true
     try {
-      await api.get(`/api/pay/${id}`)
-      await fetchTransactions()
+      await api.post(`/api/pay/${id}`, null, {
+        headers: { 'Idempotency-Key': crypto.randomUUID() }
+      })
+      await syncTransactions()
       toast.success('Payment processed successfully!')
       return true
     } catch (error: any) {
@@ -116,7 +223,7 @@ export const useTransactionsStore = defineStore('transactions', () => {
     loading.value = true
     try {
       await api.post(`/api/update_amount/${id}`, { amount })
-      await fetchTransactions()
+      await syncTransactions()
       toast.success('Amount updated successfully!')
       return true
     } catch (error: any) {
@@ -132,7 +239,7 @@ export const useTransactionsStore = defineStore('transactions', () => {
     loading.value = true
     try {
       await api.put(`/api/update_delivery_status/${id}`, { delivery_status })
-      await fetchTransactions()
+      await syncTransactions()
       toast.success('Delivery status updated successfully!')
       return true
     } catch (error: any) {
@@ -148,7 +255,7 @@ export const useTransactionsStore = defineStore('transactions', () => {
     loading.value = true
     try {
       await api.put(`/api/update_delivery_date/${id}`, { delivery_date })
-      await fetchTransactions()
+      await syncTransactions()
       toast.success('Delivery date updated successfully!')
       return true
     } catch (error: any) {
@@ -162,8 +269,15 @@ export const useTransactionsStore = defineStore('transactions', () => {
 
   return {
     transactions,
+    recentTransactions,
+    stats,
     loading,
+    loaded,
     fetchTransactions,
+    syncTransactions,
+    fetchStats,
+    fetchRecentTransactions,
+    fetchDashboard,
     createTransaction,
     updateTransaction,
     deleteTransaction,